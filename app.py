@@ -1,7 +1,7 @@
 import sys
 import os
 import itertools as itt
-from copy import copy
+from array import array
 
 import numpy as np
 import pandas as pd
@@ -9,20 +9,30 @@ import pygame as pg
 import pdb
 
 import utils
+from zobrist import zobrist_table, PositionIndex
+from history import History, ReplayCache, NO_POINT
 
 STONE_SIZE = 10
 SCREEN_SIZE = 450, 450
-REFRESH_RATE = 60
+KEY_REPEAT = 300, 50 # delay and interval in ms of held down keys
+SELECTOR_KEYS = pg.K_UP, pg.K_DOWN, pg.K_LEFT, pg.K_RIGHT
+EXPOSE_EVENTS = pg.VIDEOEXPOSE, getattr(pg, 'WINDOWEXPOSED', pg.VIDEOEXPOSE)
 WHITE, BLACK = (0, 0, 0), (255, 255, 255)
 LINE_COLOR = 0, 0, 0
 LINE_WIDTH = 2
 SELECTOR_COLOR = 255, 0, 0
 SELECTOR_SIZE = LINE_WIDTH + 2
+BOARD_COLOR = 204, 153, 0
+REPLAY_CACHE_BYTES = 1 << 20 # memory for positions kept for undo and redo
+# Log every step of the rules, e.g. each chain found; the calls are skipped
+# entirely when off, which the rules need to be fast
+TRACE = False
 
 class Player(object):
 
-    def __init__(self, color):
+    def __init__(self, color, number):
         self.color = color
+        self.number = number # value of this player's stones in State.board
         self.score = 0
         log.debug("created player: <{}>".format(self))
 
@@ -41,13 +51,14 @@ class Player(object):
         pass
 
 class Stone(object):
+    # A view of one stone, made on demand; a State keeps its stones in a
+    # board array rather than as Stone objects
+    __slots__ = ('y', 'x', 'player', 'grid')
 
     def __init__(self, y, x, player, grid):
-        self.location = self.y, self.x = y, x
+        self.y, self.x = y, x
         self.player = player
-        self.size = STONE_SIZE
         self.grid = grid
-        log.debug("created stone: <{}>".format(self))
 
     def __repr__(self):
         msg = "<Stone: location={}, player={}>"
@@ -60,46 +71,55 @@ class Stone(object):
                     type(other), Stone)
             raise TypeError(msg)
         eq_relations = [self.location == other.location,
-                self.player == self.player]
+                self.player == other.player]
         return all(eq_relations)
 
+    @property
+    def location(self):
+        return self.y, self.x
+
+    @property
+    def size(self):
+        return STONE_SIZE
+
     def surrounding_locations(self):
-        locs = []
-
-        for dx in [-1, 1]:
-            x = self.x + dx
-            y = self.y
-            if x >= 0 and\
-                    x < self.grid.dims[1] and\
-                    y >= 0 and\
-                    y < self.grid.dims[0]:
-                locs.append((y, x))
-
-        for dy in [-1, 1]:
-            x = self.x
-            y = self.y + dy
-            if x >= 0 and\
-                    x < self.grid.dims[1] and\
-                    y >= 0 and\
-                    y < self.grid.dims[0]:
-                locs.append((y, x))
-
-        log.debug("the points surrounding <{}> are <{}>".format(
-            self.location, locs))
+        locs = list(self.grid.neighbors[self.location])
+        if TRACE:
+            log.debug("the points surrounding <%s> are <%s>",
+                self.location, locs)
         return locs
 
     def draw(self, screen):
-        pg.draw.circle(screen,
+        draw_circle(screen,
                 self.player.color,
-                self.grid.get_point(*self.location[::-1]),
+                self.grid.centers[self.location],
                 self.size)
 
+_neighbors = {} # Grid.neighbors for each dims
+_sprites = {} # (color, radius) -> pre-rendered circle
+
+def draw_circle(screen, color, center, radius):
+    # Blit a circle of <color> centered on <center>, rendered only the first
+    # time it is asked for
+    if (color, radius) not in _sprites:
+        sprite = pg.Surface((2 * radius + 1, 2 * radius + 1), pg.SRCALPHA)
+        pg.draw.circle(sprite, color, (radius, radius), radius)
+        _sprites[color, radius] = sprite
+    screen.blit(_sprites[color, radius],
+            (center[0] - radius, center[1] - radius))
+
 class Grid(object):
 
     def __init__(self, screensize, x = 9, y = 9):
         self.dims = x, y
         self.screensize = screensize
         self.points = self._calculate_grid_points()
+        self.neighbors = self._calculate_neighbors()
+        # screen position of each location, as get_point gives it
+        self.centers = dict(((y, x), tuple(self.get_point(x, y)))
+                for y, x in itt.product(range(self.dims[0]),
+                    range(self.dims[1])))
+        self.background = None # the empty board, see render
         log.debug("created grid: <{}>".format(self))
 
     def __repr__(self):
@@ -128,6 +148,20 @@ class Grid(object):
             np.shape(points)))
         return points
 
+    def _calculate_neighbors(self):
+        # the locations orthogonally next to each location, left, right, up
+        # then down; shared by every grid of the same dimensions
+        if self.dims in _neighbors:
+            return _neighbors[self.dims]
+        neighbors = _neighbors[self.dims] = {}
+        for y, x in itt.product(range(self.dims[0]), range(self.dims[1])):
+            locs = []
+            for ny, nx in [(y, x - 1), (y, x + 1), (y - 1, x), (y + 1, x)]:
+                if 0 <= nx < self.dims[1] and 0 <= ny < self.dims[0]:
+                    locs.append((ny, nx))
+            neighbors[y, x] = tuple(locs)
+        return neighbors
+
     def get_point(self, y, x):
         point = [int(a) for a in self.points[y, x]]
         # NOTE this gets called in a draw loop so it's debugging spam
@@ -135,6 +169,21 @@ class Grid(object):
         #     (y, x), point))
         return point
 
+    def render(self, color):
+        # Return the empty board as a Surface, drawn on the first call and
+        # then reused as the background of every frame
+        if self.background is None:
+            self.background = pg.Surface(self.screensize)
+            self.background.fill(color)
+            self.draw(self.background)
+        return self.background
+
+    def rect(self, loc):
+        # The area a stone at <loc> covers
+        r = STONE_SIZE + 1
+        x, y = self.centers[loc]
+        return pg.Rect(x - r, y - r, 2 * r + 1, 2 * r + 1)
+
     def draw(self, screen):
 
         sy, sx = screen.get_size()
@@ -190,22 +239,36 @@ class Selector(object):
             pg.key.name(dirn), self.location))
 
     def draw(self, screen):
-        pg.draw.circle(screen,
+        draw_circle(screen,
                 SELECTOR_COLOR,
-                self.grid.get_point(*self.location[::-1]),
+                self.grid.centers[tuple(self.location)],
                 SELECTOR_SIZE)
 
 class State(object):
+    # The stones on the board are the nonzero entries of <board>, player
+    # numbers laid out like the board in play_in_terminal.py; Stone objects
+    # are only made when asked for, e.g. by stone_at
+    __slots__ = ('turn', 'board', 'players', 'grid', 'key', 'move',
+            'prisoners', 'undo_stack')
 
-    def __init__(self, turn, board_stones, bowl_stones):
+    def __init__(self, turn, board, players, grid, key = 0):
         self.turn = turn
-        self.board_stones = board_stones
-        self.bowl_stones = bowl_stones
-        log.debug("created state: <{}>".format(self))
+        self.board = board
+        self.players = players
+        self.grid = grid
+        self.key = key # Zobrist hash of the stones on the board
+        # (player number, location, locations captured) to reach this state
+        self.move = None
+        # stones of each player taken off the board, by player number - 1
+        self.prisoners = [0] * len(players)
+        # (player number, location, (location, player number) of each stone
+        # captured, key and move before) of each stone played, for undo
+        self.undo_stack = []
+        log.debug("created state: <%s>", self)
 
     def __repr__(self):
         msg = "<State: turn={}, nstones={}>"
-        msg = msg.format(self.turn, len(self.get_stones()))
+        msg = msg.format(self.turn, np.count_nonzero(self.board))
         return msg
 
     def __eq__(self, other):
@@ -213,57 +276,104 @@ class State(object):
             msg = "Received type <{}>, expected <{}>".format(
                     type(other), State)
             raise TypeError(msg)
-        for stone in self.bowl_stones:
-            if stone not in other.bowl_stones:
-                return False
-        for stone in self.board_stones:
-            if stone not in other.board_stones:
-                return False
-        return True
+        return np.array_equal(self.board, other.board) and \
+                self.prisoners == other.prisoners
+
+    def copy(self):
+        # Copy with its own board and counts, so the copy can be played on
+        state = State(self.turn, self.board.copy(), self.players, self.grid,
+                self.key)
+        state.move = self.move
+        state.prisoners = list(self.prisoners)
+        return state
 
-    def get_stones(self):
-        return self.board_stones + self.bowl_stones
+    @property
+    def board_stones(self):
+        # Views of the stones on the board
+        ys, xs = np.nonzero(self.board)
+        return [self.stone_at(loc) for loc in zip(ys.tolist(), xs.tolist())]
 
     def stone_at(self, loc):
-        for stone in self.board_stones:
-            if stone.location == loc:
-                log.debug("there is a stone at <{}>".format(loc))
-                return stone
-        log.debug("there is not a stone at <{}>".format(loc))
+        number = self.board[loc]
+        if number:
+            if TRACE: log.debug("there is a stone at <%s>", loc)
+            return Stone(loc[0], loc[1], self.players[number - 1], self.grid)
+        if TRACE: log.debug("there is not a stone at <%s>", loc)
         return False
 
-    def capture_stone(self, stone):
-        if stone in self.board_stones:
-            self.board_stones.remove(stone)
-            self.bowl_stones.append(stone)
-            log.debug("<{}> has been captured".format(stone))
-        else:
-            msg = "stone <{}> isn't on the board".format(stone)
-            log.error(msg)
-            raise Exception(msg)
+    def play(self, number, loc):
+        # Put a stone of player <number> at <loc>, so that undo takes it
+        # back along with the stones captured after it
+        self.undo_stack.append((number, loc, [], self.key, self.move))
+        self.board[loc] = number
+
+    def capture_stones(self, locs):
+        for loc in locs:
+            number = self.board[loc]
+            if not number:
+                msg = "there isn't a stone at <{}>".format(loc)
+                log.error(msg)
+                raise Exception(msg)
+            self.board[loc] = 0
+            self.prisoners[number - 1] += 1
+            if self.undo_stack:
+                self.undo_stack[-1][2].append((loc, number))
+        if TRACE: log.debug("<%s> have been captured", locs)
+
+    def undo(self):
+        # Take back the last stone played and put back what it captured
+        number, loc, captured, self.key, self.move = self.undo_stack.pop()
+        self.board[loc] = 0
+        for cloc, cnumber in captured:
+            self.board[cloc] = cnumber
+            self.prisoners[cnumber - 1] -= 1
+        if TRACE: log.debug("took back the stone at <%s>", loc)
 
     def draw(self, screen):
-        for stone in self.board_stones:
-            stone.draw(screen)
+        board = self.board
+        centers = self.grid.centers
+        ys, xs = np.nonzero(board)
+        for y, x in zip(ys.tolist(), xs.tolist()):
+            draw_circle(screen,
+                    self.players[board[y, x] - 1].color,
+                    centers[y, x],
+                    STONE_SIZE)
 
 class Board(object):
 
     def __init__(self, screensize, x = 9, y = 9):
         self.screensize = screensize
-        self.players = Player(WHITE), Player(BLACK)
+        self.players = Player(WHITE, 1), Player(BLACK, 2)
         self.grid = Grid(screensize, x, y)
         self.dims = self.grid.dims
-        self.states = [State(0, [], [])]
+        self.state = State(0, np.zeros(self.dims, dtype=np.int8),
+                self.players, self.grid)
+        # only the current State is kept, earlier positions are rebuilt from
+        # per-move deltas
+        self.history = History(self.state.board)
+        self.replay = ReplayCache(self.history, REPLAY_CACHE_BYTES)
+        self.cursor = 0 # moves shown; fewer than len(history) after undo
+        self.zobrist = zobrist_table(self.dims[0] * self.dims[1])
+        # superko index of move numbers, compared exactly on a key collision
+        self.positions = PositionIndex(equal = self.same_position)
+        self.positions.add(self.state.key, 0)
+        self.keys = array('Q', [self.state.key]) # key after each move
+        # prisoners of every player after each move, one row of
+        # len(players) per move, so rebuilt states keep their counts
+        self.prisoners = array('l', self.state.prisoners)
         self.cur_player = self.players[0]
         self.selector = Selector(color = SELECTOR_COLOR,
                 size = SELECTOR_SIZE,
                 grid = self.grid)
+        # the stones and selector location on screen, see draw_changes
+        self.drawn = None
+        self.drawn_selector = None
         log.debug("created board: <{}>".format(self))
 
     def __repr__(self):
-        msg = "<Board: dimensions={}, nplayers={}, nstates={}, " +\
+        msg = "<Board: dimensions={}, nplayers={}, nmoves={}, " +\
                 "curplayer={}, selector at {}>"
-        msg = msg.format(self.dims, len(self.players), len(self.states),
+        msg = msg.format(self.dims, len(self.players), len(self.history),
                 self.cur_player, self.selector.location)
         return msg
 
@@ -280,65 +390,153 @@ class Board(object):
         return all(eq_relations)
 
     def undo(self):
-        log.warning("undo not yet implemented")
+        if self.cursor == 0:
+            log.debug("nothing to undo")
+            return
+        if not self.state.undo_stack:
+            self.jump(self.cursor - 1)
+            return
+        # take the move back in place rather than rebuilding the position
+        self.state.undo()
+        self.state.turn = self.state.turn - 1
+        self.cursor = self.cursor - 1
+        self.cur_player = self.players[self.cursor % len(self.players)]
+        log.debug("took back move <{}> of <{}>".format(
+            self.cursor + 1, len(self.history)))
+
+    def redo(self):
+        if self.cursor == len(self.history):
+            log.debug("nothing to redo")
+            return
+        self.jump(self.cursor + 1)
+
+    def jump(self, n):
+        # Show the position after move <n>; the later moves are kept for
+        # redo until a new move is played
+        self.state = State(n, self.replay.position(n), self.players,
+                self.grid, self.keys[n])
+        k = len(self.players)
+        self.state.prisoners = self.prisoners[n * k:(n + 1) * k].tolist()
+        self.cursor = n
+        self.cur_player = self.players[n % len(self.players)]
+        log.debug("jumped to move <{}> of <{}>".format(n, len(self.history)))
+
     def pass_move(self):
         log.warning("pass_move not yet implemented")
 
     def set_state(self, state):
-        self.states.append(state)
+        if self.cursor < len(self.history):
+            self.forget_after(self.cursor)
+        number, loc, cstones = state.move
+        self.history.append(number, self.point(loc),
+                [self.point(cloc) for cloc in cstones],
+                self.ko_point(loc, cstones, state), state.board)
+        self.positions.add(state.key, len(self.history))
+        self.keys.append(state.key)
+        self.prisoners.extend(state.prisoners)
+        self.cursor = len(self.history)
+        self.state = state
+
+    def forget_after(self, n):
+        # Drop the undone moves after move <n>, branching the game there
+        for m in range(n + 1, len(self.history) + 1):
+            self.positions.discard(self.keys[m], m)
+        del self.keys[n + 1:]
+        del self.prisoners[(n + 1) * len(self.players):]
+        self.history.truncate(n)
+        self.replay.forget_after(n)
+
+    def same_position(self, n, state):
+        # Whether the position after move <n> has the same stones as <state>;
+        # undone moves are not part of the game
+        return n <= self.cursor and \
+                np.array_equal(self.replay.position(n), state.board)
+
+    def point(self, loc):
+        return loc[0] * self.dims[1] + loc[1]
+
+    def ko_point(self, loc, cstones, state):
+        # The point of a lone stone captured by a lone stone left in atari
+        if len(cstones) != 1 or len(self.get_chain(loc, state)) != 1:
+            return NO_POINT
+        libs = [n for n in self.grid.neighbors[loc] if not state.board[n]]
+        if len(libs) != 1:
+            return NO_POINT
+        return self.point(cstones[0])
+
+    def stone_key(self, number, loc):
+        # Zobrist key of a stone of player <number> at <loc>, xor'd into a
+        # state's key to add or remove it
+        return self.zobrist[number][self.point(loc)]
 
     def get_state(self):
-        return self.states[-1]
+        return self.state
 
     def move_select(self, dirn):
         self.selector.move(dirn)
 
     def stone_at(self, loc):
         state = self.get_state()
-        return state.stone_at(loc)
+        return state.stone_at(tuple(loc))
 
     def place_stone(self):
-        loc = self.selector.location
-        new_stone = Stone(y = loc[0], x = loc[1],
-                player = self.cur_player,
-                grid = self.grid)
-
-        state = self.valid_move(new_stone)
+        state = self.play_move(tuple(self.selector.location))
         if state:
             state.turn = state.turn + 1
             self.next_turn(state)
 
-    def valid_move(self, new_stone):
+    @utils.profiled
+    def valid_move(self, loc):
+        # Whether the current player may play at <loc>, trying the move on
+        # the current state and taking it back
+        state = self.play_move(loc)
+        if not state:
+            return False
+        state.undo()
+        return True
+
+    @utils.profiled
+    def play_move(self, loc):
+        # Play a stone of the current player at <loc> on the current state in
+        # place and return the state, or return False and leave the state as
+        # it was if the move is invalid; no state is copied either way
+        number = self.cur_player.number
+
         # avoid collisions
-        if self.stone_at(new_stone.location):
-            log.debug("move <{}> is invalid due to collision".format(
-                new_stone))
+        if self.get_state().board[loc]:
+            if TRACE: log.debug("move <%s> is invalid due to collision", loc)
             return False
 
-        # no placing in a surrounded position
-        state = copy(self.get_state())
-        state.board_stones = state.board_stones + [new_stone]
-        chain = self.get_chain(new_stone, state)
-        if self.is_surrounded(chain, state):
-            log.debug("move <{}> is invalid because it is surrounded".format(
-                new_stone))
+        state = self.get_state()
+        state.play(number, loc)
+        state.key = state.key ^ self.stone_key(number, loc)
+        cstones = self.capturable_stones_next_to(loc, state)
+
+        # no placing in a surrounded position, unless it captures
+        chain = self.get_chain(loc, state)
+        if not cstones and self.is_surrounded(chain, state):
+            if TRACE:
+                log.debug("move <%s> is invalid because it is surrounded", loc)
+            state.undo()
             return False
 
         # capture stones if there are any capturable
-        cstones = self.capturable_stones_next_to(new_stone, state)
-        if cstones: log.debug("capturing stones: <{}>".format(cstones))
-        else: log.debug("no stones to capture")
-        for cstone in cstones:
-            state.capture_stone(cstone)
-
-        # make sure it's not a repeat move
-        if state in self.states:
-            log.debug("move <{}> is invalid due to repeat state <{}>".format(
-                new_stone, self.states[self.states.index(state)]))
+        if TRACE: log.debug("capturing stones: <%s>", cstones)
+        for cloc in cstones:
+            state.key = state.key ^ self.stone_key(state.board[cloc], cloc)
+        state.capture_stones(cstones)
+
+        # make sure it's not a repeat move (positional superko), looked up by
+        # Zobrist key and only compared stone by stone on a key collision
+        if self.positions.seen(state.key, state):
+            if TRACE:
+                log.debug("move <%s> is invalid due to repeat state", loc)
+            state.undo()
             return False
+        state.move = number, loc, cstones
 
         # otherwise valid move
-        log.debug("<{}> is a valid move".format(new_stone))
+        if TRACE: log.debug("<%s> is a valid move", loc)
         return state
 
     def next_turn(self, next_state):
@@ -350,64 +548,134 @@ class Board(object):
         log.debug("starting turn <{}> with player <{}>".format(
             next_state.turn, self.cur_player))
 
-    def capturable_stones_next_to(self, stone, state):
-        assert type(stone) == Stone
-        assert type(state) == State
+    @utils.profiled
+    def capturable_stones_next_to(self, loc, state):
+        # Return the locations of the stones that the stone at <loc> leaves
+        # surrounded
+        board = state.board
+        number = board[loc]
         capturable_stones = []
-        for loc in stone.surrounding_locations():
-            stone = state.stone_at(loc)
-            if stone:
-                if stone.player != self.cur_player:
-                    chain = self.get_chain(stone, state)
-                    if self.is_surrounded(chain, state):
-                        for cstone in chain:
-                            capturable_stones.append(cstone)
-        log.debug("the capturable stones next to <{}> are: <{}>".format(
-            stone, capturable_stones))
+        for n in self.grid.neighbors[loc]:
+            other = board[n]
+            if other and other != number and n not in capturable_stones:
+                chain = self.get_chain(n, state)
+                if self.is_surrounded(chain, state):
+                    capturable_stones.extend(chain)
+        if TRACE:
+            log.debug("the capturable stones next to <%s> are: <%s>",
+                loc, capturable_stones)
         return capturable_stones
 
+    @utils.profiled
     def is_surrounded(self, chain, potential_state):
         # Return True if all stones in chain have stones all around them
-        for stone in chain:
-            for loc in stone.surrounding_locations():
-                if not potential_state.stone_at(loc):
-                    log.debug("chain with <{}> is not surrounded".format(
-                        chain[0]))
+        board = potential_state.board
+        neighbors = self.grid.neighbors
+        for loc in chain:
+            for n in neighbors[loc]:
+                if not board[n]:
+                    if TRACE:
+                        log.debug("chain with <%s> is not surrounded",
+                            chain[0])
                     return False
-        log.debug("chain with <{}> is surrounded".format(chain[0]))
+        if TRACE: log.debug("chain with <%s> is surrounded", chain[0])
         return True
 
-    def get_chain(self, stone, state):
-        log.debug("getting chain starting at <{}>".format(stone))
-        stones_to_check = [stone]
-        checked_stones = []
-        chain = [stone]
-        while len(stones_to_check) > 0:
-            check_stone = stones_to_check.pop()
-            checked_stones.append(check_stone)
-            if check_stone.player == stone.player:
-                for loc in check_stone.surrounding_locations():
-                    possible_check_stone = self.stone_at(loc)
-                    if possible_check_stone:
-                        if possible_check_stone.player == stone.player:
-                            if possible_check_stone not in checked_stones:
-                                chain.append(possible_check_stone)
-                                stones_to_check.append(possible_check_stone)
-
-        log.debug("calculated chain connected to <{}>: <{}>".format(
-            stone, chain))
-        log.debug("chain length: <{}>".format(len(chain)))
+    @utils.profiled
+    def get_chain(self, loc, state):
+        # Return the locations of the stones connected to the stone at <loc>
+        if TRACE: log.debug("getting chain starting at <%s>", loc)
+        board = state.board
+        neighbors = self.grid.neighbors
+        number = board[loc]
+        chain = [loc]
+        seen = set(chain)
+        for check in chain: # grows as the chain is found
+            for n in neighbors[check]:
+                if n not in seen and board[n] == number:
+                    seen.add(n)
+                    chain.append(n)
+
+        if TRACE:
+            log.debug("calculated chain connected to <%s>: <%s>", loc, chain)
+            log.debug("chain length: <%s>", len(chain))
         return chain
 
     def draw(self, screen):
-        self.grid.draw(screen)
+        # Draw the whole board
+        screen.blit(self.grid.render(BOARD_COLOR), (0, 0))
         state = self.get_state()
         state.draw(screen)
         self.selector.draw(screen)
+        self.drawn = state.board.copy()
+        self.drawn_selector = tuple(self.selector.location)
+
+    @utils.profiled
+    def draw_changes(self, screen):
+        ## Redraw only the points whose stones changed since the last draw,
+        # and the points the selector left and moved to
+        # Output
+        #   rects : (list(pg.Rect)) the areas redrawn, for pg.display.update;
+        #       empty when nothing changed
+
+        if self.drawn is None:
+            self.draw(screen)
+            return [screen.get_rect()]
+        board = self.get_state().board
+        ys, xs = np.nonzero(board != self.drawn)
+        locs = set(zip(ys.tolist(), xs.tolist()))
+        selector = tuple(self.selector.location)
+        if selector != self.drawn_selector:
+            locs.update([self.drawn_selector, selector])
+            self.drawn_selector = selector
+        if locs:
+            self.drawn[...] = board
+        return [self.draw_point(screen, loc) for loc in locs]
+
+    def draw_point(self, screen, loc):
+        # Redraw the background, stone and selector at <loc>
+        rect = self.grid.rect(loc)
+        screen.blit(self.grid.render(BOARD_COLOR), rect, rect)
+        number = self.get_state().board[loc]
+        if number:
+            draw_circle(screen, self.players[number - 1].color,
+                    self.grid.centers[loc], STONE_SIZE)
+        if loc == tuple(self.selector.location):
+            self.selector.draw(screen)
+        return rect
 
 def test(log):
     log.debug("no tests")
 
+def handle_key(board, key):
+    # Act on one key press
+    log.debug("key pressed: <{}>".format(pg.key.name(key)))
+
+    # Move the selector
+    if key in SELECTOR_KEYS:
+        board.move_select(key)
+
+    # Place a stone
+    elif key == pg.K_SPACE:
+        log.debug("placing stone")
+        board.place_stone()
+
+    # TODO
+    elif key == pg.K_p:
+        log.debug("passing")
+        board.pass_move()
+    elif key == pg.K_u:
+        log.debug("undoing")
+        board.undo()
+    elif key == pg.K_r:
+        log.debug("redoing")
+        board.redo()
+
+    # Quit
+    elif key == pg.K_ESCAPE:
+        log.debug("quitting")
+        sys.exit(1)
+
 def main(log):
 
     log.debug("initializing app")
@@ -416,59 +684,37 @@ def main(log):
     size = width, height = SCREEN_SIZE
     black = 0, 0, 0
     white = 255, 255, 255
-    board_color = 204, 153, 0
 
     screen = pg.display.set_mode(size)
-    clock = pg.time.Clock()
+    pg.key.set_repeat(*KEY_REPEAT)
     board = Board(screen.get_size())
+    board.draw(screen)
+    pg.display.flip()
 
     log.debug("starting main loop")
     while 1:
-        clock.tick(REFRESH_RATE)
-        for event in pg.event.get():
+        # sleep until something happens, then handle everything queued
+        events = [pg.event.wait()] + pg.event.get()
+        for event in events:
 
             if event.type == pg.QUIT:
                 log.debug("quitting")
                 sys.exit()
 
-            keypress = pg.key.get_pressed()
-            if sum(keypress) > 0:
-                key_name = pg.key.name(keypress.index(1))
-                log.debug("key pressed: <{}>".format(key_name))
-
-            # Move the selector
-            if keypress[pg.K_UP]:
-                board.move_select(pg.K_UP)
-            elif keypress[pg.K_DOWN]:
-                board.move_select(pg.K_DOWN)
-            elif keypress[pg.K_LEFT]:
-                board.move_select(pg.K_LEFT)
-            elif keypress[pg.K_RIGHT]:
-                board.move_select(pg.K_RIGHT)
-
-            # Place a stone
-            elif keypress[pg.K_SPACE]:
-                log.debug("placing stone")
-                board.place_stone()
-
-            # TODO
-            elif keypress[pg.K_p]:
-                log.debug("passing")
-                board.pass_move()
-            elif keypress[pg.K_u]:
-                log.debug("undoing")
-                board.undo()
-
-            # Quit
-            elif keypress[pg.K_ESCAPE]:
-                log.debug("quitting")
-                sys.exit(1)
+            elif event.type == pg.KEYDOWN:
+                handle_key(board, event.key)
+
+            # the window was uncovered, so everything is drawn again
+            elif event.type in EXPOSE_EVENTS:
+                board.draw(screen)
+                pg.display.flip()
 
-        screen.fill(board_color)
-        board.draw(screen)
-        pg.display.flip()
+        # only the points that changed are drawn and sent to the display
+        rects = board.draw_changes(screen)
+        if rects:
+            pg.display.update(rects)
 
 if __name__ == '__main__':
-    log = utils.make_logger('go-app', verbose = True)
+    log = utils.make_logger('go-app', verbose = True, queued = True)
     test(log)
     main(log)
@@ -0,0 +1,155 @@
+### Random-access archives of Go games
+# Author: Eric Kalosa-Kenyon
+# License: MIT
+#
+# An archive is a file of binary records as written by records.py together
+# with an index file beside it, <path>.idx, holding the byte offset of every
+# record as a little-endian uint64. Both files are only ever appended to.
+# Reading maps both files with mmap, so game N is found by one lookup in the
+# index and its moves are a numpy view into the mapped file; nothing before
+# it is parsed.
+###
+
+## Imports
+
+# Standard libraries
+import mmap
+import os
+
+# 3rd party libraries
+import numpy as np
+
+# Local libraries
+from records import HEADER, move_width, pack_record
+from rules import PASS
+from groups import Groups
+
+## Parameters
+
+INDEX_SUFFIX = '.idx'
+OFFSET = np.dtype('<u8')
+
+## Subroutines
+
+def index_path(path):
+    return(path + INDEX_SUFFIX)
+
+def append_games(path, games):
+    ## Append games to the archive at <path>, creating it if need be
+    # Input
+    #   games : iterable of (points, size, nplayers) where points are flat
+    #       points, PASS for a pass
+
+    with open(path, 'ab') as f, open(index_path(path), 'ab') as idx:
+        offset = f.tell()
+        for points, size, nplayers in games:
+            record = pack_record(points, size, nplayers)
+            f.write(record)
+            idx.write(np.array([offset], dtype=OFFSET).tobytes())
+            offset += len(record)
+
+def append_game(path, points, size, nplayers=2):
+    append_games(path, [(points, size, nplayers)])
+
+def build_index(path):
+    ## Write the index of an existing file of records, e.g. one written by
+    # records.append_game, reading only the record headers
+
+    offsets = []
+    with open(path, 'rb') as f:
+        end = os.fstat(f.fileno()).st_size
+        offset = 0
+        while(offset < end):
+            offsets.append(offset)
+            f.seek(offset)
+            nmoves, size, nplayers = HEADER.unpack(f.read(HEADER.size))
+            offset += HEADER.size + nmoves * move_width(size)
+    with open(index_path(path), 'wb') as idx:
+        idx.write(np.array(offsets, dtype=OFFSET).tobytes())
+
+def _map(path):
+    # Map the file at <path> for reading; empty files cannot be mapped
+    with open(path, 'rb') as f:
+        if(os.fstat(f.fileno()).st_size == 0):
+            return(None)
+        return(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+
+## Classes
+
+class Archive(object):
+
+    def __init__(self, path):
+        ## Open the archive at <path> for random access
+        # Games appended after opening are not seen until it is reopened
+
+        self.path = path
+        self.data = _map(path)
+        self.index = _map(index_path(path))
+        self.offsets = np.frombuffer(self.index, dtype=OFFSET) if \
+            self.index is not None else np.zeros(0, dtype=OFFSET)
+
+    def __repr__(self):
+        msg = "<Archive: path={}, ngames={}>".format(self.path, len(self))
+        return(msg)
+
+    def __len__(self):
+        return(len(self.offsets))
+
+    def __enter__(self):
+        return(self)
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        # Views into the maps must be dropped before the maps can close
+        self.offsets = np.zeros(0, dtype=OFFSET)
+        for m in (self.data, self.index):
+            if(m is not None):
+                m.close()
+        self.data = self.index = None
+
+    def header(self, n):
+        # Return the (nmoves, size, nplayers) of game <n>
+        return(HEADER.unpack_from(self.data, int(self.offsets[n])))
+
+    def moves(self, n):
+        ## Return the moves of game <n> without copying them
+        # Output
+        #   moves : (np.array) read-only view of flat points; a pass is
+        #       0xff, or 0xffff on boards larger than 15x15, see
+        #       records.pack_record
+        #   size : (int) length of a side of the board
+        #   nplayers : (int) players taking turns
+
+        nmoves, size, nplayers = self.header(n)
+        dtype = '<u1' if move_width(size) == 1 else '<u2'
+        moves = np.frombuffer(self.data, dtype=dtype, count=nmoves,
+            offset=int(self.offsets[n]) + HEADER.size)
+        return(moves, size, nplayers)
+
+    def __getitem__(self, n):
+        # Return game <n> as (size, nplayers, points), as records.read_records
+        moves, size, nplayers = self.moves(n)
+        blank = np.iinfo(moves.dtype).max
+        points = np.where(moves == blank, PASS, moves.astype(np.int32))
+        return(size, nplayers, points.tolist())
+
+    def __iter__(self):
+        for n in range(len(self)):
+            yield(self[n])
+
+    def position(self, n, k=None):
+        ## Rebuild the board of game <n> after its first <k> moves
+        # Output
+        #   board : (np.array) player numbers, 0 for empty
+
+        size, nplayers, points = self[n]
+        if(k is None):
+            k = len(points)
+        board = np.zeros((size, size), dtype=np.int8)
+        groups = Groups(board)
+        for i, p in enumerate(points[:k]):
+            if(p != PASS):
+                groups.place(i % nplayers + 1, p)
+        return(board)
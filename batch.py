@@ -0,0 +1,209 @@
+### Batched self-play: many games of Go stepped in lockstep
+# Author: Eric Kalosa-Kenyon
+# License: MIT
+#
+# N games live in one (N, size, size) int8 array laid out like the board in
+# play_in_terminal.py. Every step plays one move in every unfinished game with
+# array operations, so the Python overhead of a move is paid once per step
+# rather than once per game. The chains of every game are kept up to date as
+# stones are played: a label per point and a liberty count per label, so a
+# step only touches the chains next to the stones it places or removes. With
+# a few hundred games in a batch a move costs less than one played through
+# selfplay.random_game, with a few dozen about the same. Only simple ko is
+# enforced, as in playout.py, so some games cycle until max_moves and a batch
+# of games takes longer than the move cost alone suggests.
+###
+
+## Imports
+
+# 3rd party libraries
+import numpy as np
+
+# Local libraries
+from vectorized import neighbor_indices, OFF_BOARD, DIRECTIONS
+from rules import PASS, NO_KO
+
+## Subroutines
+
+def first_sides(labels):
+    # Mark, in each row of <labels>, the first side on which each chain
+    # appears, so that a chain touching a point twice is counted once
+    first = np.ones(labels.shape, dtype=bool)
+    for d in range(1, labels.shape[1]):
+        first[:, d] = (labels[:, :d] != labels[:, d:d + 1]).all(axis=1)
+    return(first)
+
+## Classes
+
+class BatchGames(object):
+
+    def __init__(self, ngames, size=9, nplayers=2, max_moves=None):
+        ## Start <ngames> empty games on <size> by <size> boards
+        # Input
+        #   ngames : (int) number of games in the batch
+        #   size : (int) length of a side of the board
+        #   nplayers : (int) players take turns 1, 2, .., nplayers
+        #   max_moves : (int) moves after which a game is stopped, as simple ko
+        #       alone does not stop every cycle; defaults to 3 * size^2
+
+        self.ngames = ngames
+        self.size = size
+        self.nplayers = nplayers
+        self.max_moves = max_moves or 3 * size * size
+        self.boards = np.zeros((ngames, size, size), dtype=np.int8)
+        self.players = np.ones(ngames, dtype=np.int8) # player to move
+        self.passes = np.zeros(ngames, dtype=np.int16) # consecutive passes
+        self.ko = np.full(ngames, NO_KO, dtype=np.int32)
+        self.over = np.zeros(ngames, dtype=bool)
+        self.nmoves = np.zeros(ngames, dtype=np.int32)
+        self.captures = np.zeros((ngames, nplayers + 1), dtype=np.int32)
+        self.moves = np.full((self.max_moves, ngames), PASS, dtype=np.int16)
+
+        # Chains: each stone is labelled with the flat index, over the whole
+        # batch, of one stone of its chain, and empty points with their own
+        # flat index; liberties are counted per label
+        m2 = size * size
+        self.points = np.arange(ngames * m2, dtype=np.int32).reshape(-1, m2)
+        self.labels = self.points.copy()
+        self.libs = np.zeros(ngames * m2, dtype=np.int32)
+
+    def __repr__(self):
+        msg = "<BatchGames: ngames={}, size={}, over={}>".format(
+            self.ngames, self.size, int(self.over.sum()))
+        return(msg)
+
+    def sides(self, a, fill):
+        # Return views of the four neighbors of every point of the boards
+        # <a>, shaped (n, size, size), with <fill> past the edge
+        m = self.size
+        padded = np.pad(a, ((0, 0), (1, 1), (1, 1)), constant_values=fill)
+        return([padded[:, 1 + dy:1 + dy + m, 1 + dx:1 + dx + m]
+            for dy, dx in DIRECTIONS])
+
+    def legal(self):
+        # Return the (N, size, size) mask of legal moves in every game;
+        # finished games have none
+        live = np.flatnonzero(~self.over)
+        boards = self.boards[live]
+        libs = np.where(boards != 0,
+            self.libs[self.labels[live]].reshape(boards.shape), 0)
+        player = self.players[live, None, None]
+        breathes = np.zeros(boards.shape, dtype=bool)
+        for values, near_libs in zip(self.sides(boards, OFF_BOARD),
+                self.sides(libs, 0)):
+            breathes |= (values == 0) | ((values == player) & (near_libs > 1))
+            breathes |= (values > 0) & (values != player) & (near_libs == 1)
+        mask = np.zeros(self.boards.shape, dtype=bool)
+        mask[live] = (boards == 0) & breathes
+        ko = self.ko[live]
+        mask.reshape(self.ngames, -1)[live[ko >= 0], ko[ko >= 0]] = False
+        return(mask)
+
+    def eyes(self):
+        # Return the points whose every neighbor is the mover's own stone or
+        # the edge, which random play should not fill
+        player = self.players[:, None, None]
+        own = self.boards == 0
+        for values in self.sides(self.boards, OFF_BOARD):
+            own &= (values == player) | (values == OFF_BOARD)
+        return(own)
+
+    def step(self, moves):
+        ## Play one move in every unfinished game
+        # Input
+        #   moves : (np.array(int)) flat point per game, or PASS; must be
+        #       legal, see legal()
+
+        m2 = self.size * self.size
+        moves = np.where(self.over, PASS, moves)
+        rows = np.flatnonzero(moves != PASS)
+        points = moves[rows]
+        flat = self.boards.reshape(self.ngames, m2)
+        player = self.players[rows, None]
+
+        # The four neighbors of each stone played, and their chains
+        nbr = neighbor_indices(self.size)[:, points].T
+        off = nbr == points[:, None]
+        values = np.where(off, OFF_BOARD, flat[rows[:, None], nbr])
+        labels = np.where(off, -1, self.labels[rows[:, None], nbr])
+        enemy = (values > 0) & (values != player)
+        friend = values == player
+
+        # A stone touching nothing but enemy stones and the edge that
+        # captures exactly one stone makes a ko
+        enclosed = (enemy | off).all(axis=1)
+
+        # Every enemy chain next to a stone loses that liberty, and those
+        # left with none are captured
+        enemy &= first_sides(labels)
+        self.libs[labels[enemy]] -= 1
+        dead_labels = np.where(enemy, labels, -1)
+        dead_labels[self.libs[np.maximum(dead_labels, 0)] > 0] = -1
+        taking = np.flatnonzero((dead_labels >= 0).any(axis=1))
+        cap = rows[taking]
+        dead = (self.labels[cap][:, None, :] ==
+            dead_labels[taking][:, :, None]).any(axis=1)
+        for pl in range(1, self.nplayers + 1):
+            self.captures[cap, pl] += (dead & (flat[cap] == pl)).sum(axis=1)
+        flat[cap] = np.where(dead, 0, flat[cap])
+        self.labels[cap] = np.where(dead, self.points[cap], self.labels[cap])
+
+        # Each point emptied is a new liberty of every chain next to it
+        k, q = np.nonzero(dead)
+        near = neighbor_indices(self.size)[:, q].T
+        beside = self.labels[cap[k, None], near]
+        gain = (flat[cap[k, None], near] != 0) & first_sides(beside)
+        np.add.at(self.libs, beside[gain], 1)
+
+        # Place the stones, merge them with the chains they touch and count
+        # the liberties of the chains they make
+        flat[rows, points] = player[:, 0]
+        chain = self.points[rows, points]
+        joins = np.flatnonzero(friend.any(axis=1))
+        friends = np.where(friend, labels, -1)[joins]
+        stones = (self.labels[rows[joins]][:, None, :] ==
+            friends[:, :, None]).any(axis=1)
+        self.labels[rows[joins]] = np.where(stones, chain[joins, None],
+            self.labels[rows[joins]])
+        stones = self.labels[rows] == chain[:, None]
+        libs = np.zeros(stones.shape, dtype=bool)
+        for near in self.sides(stones.reshape(-1, self.size, self.size),
+                False):
+            libs |= near.reshape(stones.shape)
+        self.libs[chain] = (libs & (flat[rows] == 0)).sum(axis=1)
+
+        self.ko[:] = NO_KO
+        single = enclosed[taking] & (dead.sum(axis=1) == 1)
+        self.ko[cap[single]] = np.argmax(dead[single], axis=1)
+
+        # Bookkeeping, the game ends after every player passes in turn
+        live = np.flatnonzero(~self.over)
+        self.moves[self.nmoves[live], live] = moves[live]
+        self.nmoves[live] += 1
+        self.passes = np.where(moves == PASS, self.passes + 1, 0)
+        self.over |= (self.passes >= self.nplayers) | \
+            (self.nmoves >= self.max_moves)
+        self.players[live] = self.players[live] % self.nplayers + 1
+
+    def random_moves(self, rng):
+        # Choose a uniformly random legal move that does not fill the mover's
+        # own eye in every game, or PASS when there is none
+        mask = (self.legal() & ~self.eyes()).reshape(self.ngames, -1)
+        weights = rng.random(mask.shape) * mask
+        moves = np.argmax(weights, axis=1)
+        return(np.where(mask.any(axis=1), moves, PASS))
+
+    def play(self, rng=None):
+        ## Play every game to the end with random moves
+        # Output
+        #   boards : (np.array) the (N, size, size) final positions
+
+        if(rng is None):
+            rng = np.random.default_rng()
+        while(not self.over.all()):
+            self.step(self.random_moves(rng))
+        return(self.boards)
+
+    def game(self, k):
+        # Return the moves of game <k> as flat points, PASS for passes
+        return(self.moves[:self.nmoves[k], k].tolist())
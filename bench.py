@@ -0,0 +1,362 @@
+### Benchmarks for the game of Go
+# Author: Eric Kalosa-Kenyon
+# License: MIT
+#
+# Times the rules (move legality, captures, legal move generation), random
+# self-play and scoring on 9x9, 13x13 and 19x19 boards, through the rules
+# engines, the functions of play_in_terminal.py and app.Board. Each result is
+# the fastest of a few timings, in microseconds per operation, and is
+# compared with a stored baseline:
+#
+#   python bench.py                 compare with bench_baseline.json
+#   python bench.py --save          record the results as the new baseline
+#   python bench.py --only app      run the benchmarks whose name has 'app'
+#
+# Timings depend on the machine, so compare against a baseline recorded on
+# the same machine.
+###
+
+## Imports
+
+# Standard libraries
+import json
+import logging
+import os
+import random
+import time
+
+# 3rd party libraries
+import numpy as np
+
+# Local libraries
+from groups import Groups
+from bitboard import Bitboard
+from playout import Playout
+from rules import candidate_moves
+from selfplay import random_game
+from batch import BatchGames
+from vectorized import legal_moves
+import play_in_terminal as terminal
+import scoring
+
+## Parameters
+
+SIZES = (9, 13, 19)
+BASELINE_FILE = 'bench_baseline.json'
+TOLERANCE = 0.5 # Slowdown over the baseline reported as a regression
+MIN_TIME = 0.2 # Seconds each timing runs for, at least
+REPEAT = 5 # Timings of each benchmark, the fastest is kept
+FILL = 0.4 # Fraction of the board covered in the mid-game positions
+NBOARDS = 64 # Final positions scored at once
+BATCH = 256 # Games played in lockstep by batch.BatchGames
+SEED = 0
+
+## Positions
+
+_midgames = {}
+
+def midgame(size):
+    ## Play random legal moves, never into the mover's own eye, until FILL of
+    # the board is covered
+    # Output
+    #   moves : (list(int)) flat points played, by players 1 and 2 in turn
+    #   player : (int) player to move
+
+    if(size not in _midgames):
+        rng = random.Random(SEED + size)
+        engine = Groups(np.zeros((size, size), dtype=np.int8))
+        moves, player = [], 1
+        while(len(moves) < 4 * size * size and
+                np.count_nonzero(engine.flat) < FILL * size * size):
+            points = list(candidate_moves(engine, player))
+            if(not points):
+                break
+            p = rng.choice(points)
+            engine.place(player, p)
+            moves.append(p)
+            player = 3 - player
+        _midgames[size] = moves, player
+    return(_midgames[size])
+
+def replay(engine_class, size):
+    # Return a rules engine of <engine_class> at the mid-game position, with
+    # its superko history, and the player to move
+    moves, player = midgame(size)
+    engine = engine_class(np.zeros((size, size), dtype=np.int8))
+    for i, p in enumerate(moves):
+        engine.place(i % 2 + 1, p)
+    return(engine, player)
+
+def capturing_moves(engine, player):
+    # Return the legal points where <player> captures something
+    return([p for p in np.flatnonzero(engine.flat == 0).tolist()
+        if engine.captures(player, p) and engine.is_legal(player, p)])
+
+def final_boards(size, n=NBOARDS):
+    # Return <n> finished random games, shaped (n, size, size)
+    rollout = Playout(size, SEED)
+    boards = np.zeros((n, size, size), dtype=np.int8)
+    for i in range(n):
+        rollout.reset()
+        rollout.run()
+        boards[i].flat[:] = rollout.color
+    return(boards)
+
+## Benchmarks
+# Each takes a board size and returns (nops, run) where run() performs nops
+# operations, or None when the benchmark cannot run
+
+def engine_is_legal(engine_class):
+    def setup(size):
+        engine, player = replay(engine_class, size)
+        points = np.flatnonzero(engine.flat == 0).tolist()
+        def run():
+            for p in points:
+                engine.is_legal(player, p)
+        return(len(points), run)
+    return(setup)
+
+def engine_capture(engine_class):
+    def setup(size):
+        engine, player = replay(engine_class, size)
+        points = capturing_moves(engine, player)
+        if(not points):
+            return(None)
+        def run():
+            for p in points:
+                engine.place(player, p)
+                engine.undo()
+        return(len(points), run)
+    return(setup)
+
+def groups_legal_moves(size):
+    engine, player = replay(Groups, size)
+    def run():
+        [p for p in range(engine.npoints) if engine.is_legal(player, p)]
+    return(1, run)
+
+def vectorized_legal_moves(size):
+    engine, player = replay(Groups, size)
+    def run():
+        legal_moves(engine, player)
+    return(1, run)
+
+def terminal_function(function):
+    # Call play_in_terminal's <function>(move, engine) on every empty point
+    def setup(size):
+        engine, player = replay(Groups, size)
+        moves = [(player, terminal.to_location(p, size))
+            for p in np.flatnonzero(engine.flat == 0).tolist()]
+        def run():
+            for move in moves:
+                function(move, engine)
+        return(len(moves), run)
+    return(setup)
+
+def selfplay_game(size):
+    rng = np.random.default_rng(SEED)
+    def run():
+        random_game(size, rng, 3 * size * size)
+    return(1, run)
+
+def selfplay_move(size):
+    # Random games one at a time, timed per move
+    def run():
+        rng = np.random.default_rng(SEED)
+        return(sum([len(random_game(size, rng, 3 * size * size)[0])
+            for i in range(8)]))
+    return(run(), run)
+
+def batch_move(size):
+    # Random games stepped in lockstep, timed per move
+    def run():
+        games = BatchGames(BATCH, size)
+        games.play(np.random.default_rng(SEED))
+        return(int(games.nmoves.sum()))
+    return(run(), run)
+
+def playout_game(size):
+    rollout = Playout(size, SEED)
+    def run():
+        rollout.reset()
+        rollout.run()
+    return(1, run)
+
+def score_boards(rule, dead):
+    def setup(size):
+        boards = final_boards(size)
+        def run():
+            scoring.score(boards, rule=rule, dead=dead)
+        return(len(boards), run)
+    return(setup)
+
+def app_board(size):
+    # Return an app.Board at the mid-game position, or None without pygame
+    try:
+        os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+        import app
+    except ImportError:
+        return(None)
+    app.log = logging.getLogger('go-app') # set up by app's main otherwise
+    moves, player = midgame(size)
+    board = app.Board(app.SCREEN_SIZE, size, size)
+    for p in moves:
+        board.selector.location = divmod(p, size)
+        board.place_stone()
+    assert(board.cursor == len(moves))
+    return(board)
+
+def app_valid_move(size):
+    board = app_board(size)
+    if(board is None):
+        return(None)
+    locs = [divmod(p, size)
+        for p in np.flatnonzero(board.state.board.reshape(-1) == 0).tolist()]
+    def run():
+        for loc in locs:
+            board.valid_move(loc)
+    return(len(locs), run)
+
+def app_capture(size):
+    board = app_board(size)
+    if(board is None):
+        return(None)
+    engine, player = replay(Groups, size)
+    locs = [divmod(p, size) for p in capturing_moves(engine, player)]
+    if(not locs):
+        return(None)
+    def run():
+        for loc in locs:
+            board.play_move(loc).undo()
+    return(len(locs), run)
+
+BENCHMARKS = [
+    ('groups.is_legal', engine_is_legal(Groups)),
+    ('bitboard.is_legal', engine_is_legal(Bitboard)),
+    ('terminal.valid_move', terminal_function(terminal.valid_move)),
+    ('app.valid_move', app_valid_move),
+    ('groups.capture', engine_capture(Groups)),
+    ('bitboard.capture', engine_capture(Bitboard)),
+    ('terminal.captured', terminal_function(terminal.captured)),
+    ('app.capture', app_capture),
+    ('groups.legal_moves', groups_legal_moves),
+    ('vectorized.legal_moves', vectorized_legal_moves),
+    ('selfplay.game', selfplay_game),
+    ('selfplay.move', selfplay_move),
+    ('batch.move', batch_move),
+    ('playout.game', playout_game),
+    ('scoring.area', score_boards(scoring.AREA, False)),
+    ('scoring.territory', score_boards(scoring.TERRITORY, True)),
+]
+
+## Runner
+
+def measure(nops, run, min_time=MIN_TIME, repeat=REPEAT):
+    # Return the fastest time per operation in us over <repeat> timings, each
+    # calling run() until <min_time> seconds have passed, after one untimed
+    # call to warm up caches
+    run()
+    best = None
+    for r in range(repeat):
+        ncalls = 0
+        start = time.perf_counter()
+        while(True):
+            run()
+            ncalls += 1
+            elapsed = time.perf_counter() - start
+            if(elapsed >= min_time):
+                break
+        us = elapsed / (ncalls * nops) * 1e6
+        best = us if best is None else min(best, us)
+    return(best)
+
+def run_benchmarks(sizes=SIZES, only=None, min_time=MIN_TIME, repeat=REPEAT):
+    ## Run the benchmarks
+    # Input
+    #   sizes : (list(int)) board sizes
+    #   only : (str) run only the benchmarks with this in their name
+    # Output
+    #   results : (dict) '<name>/<size>' -> us per operation
+
+    results = {}
+    for name, setup in BENCHMARKS:
+        if(only is not None and only not in name):
+            continue
+        for size in sizes:
+            bench = setup(size)
+            if(bench is not None):
+                results['{}/{}'.format(name, size)] = measure(*bench,
+                    min_time=min_time, repeat=repeat)
+    return(results)
+
+def compare(results, baseline, tolerance=TOLERANCE):
+    ## Compare <results> with <baseline>, both from run_benchmarks
+    # Output
+    #   rows : (list(tuple)) name, us per op, baseline us per op or None,
+    #       and whether it is a regression
+    #   regressions : (int) results more than <tolerance> slower
+
+    rows = []
+    for name, us in results.items():
+        base = baseline.get(name)
+        slower = base is not None and us > base * (1 + tolerance)
+        rows.append((name, us, base, slower))
+    return(rows, sum([r[3] for r in rows]))
+
+def report(rows):
+    # Format the output of compare as a table
+    lines = ["{:<28} {:>12} {:>12} {:>12} {:>8}".format(
+        "benchmark", "us/op", "ops/s", "baseline", "change")]
+    for name, us, base, slower in rows:
+        change = "" if base is None else "{:+.0%}".format(us / base - 1)
+        lines.append("{:<28} {:>12.2f} {:>12.0f} {:>12} {:>8}{}".format(
+            name, us, 1e6 / us, "" if base is None else "{:.2f}".format(base),
+            change, "  REGRESSION" if slower else ""))
+    return("\n".join(lines))
+
+def load_baseline(path=BASELINE_FILE):
+    if(not os.path.exists(path)):
+        return({})
+    with open(path) as f:
+        return(json.load(f))
+
+def save_baseline(results, path=BASELINE_FILE):
+    # Merge <results> into the baseline at <path>
+    baseline = load_baseline(path)
+    baseline.update(results)
+    with open(path, 'w') as f:
+        json.dump(baseline, f, indent=1, sort_keys=True)
+        f.write("\n")
+
+## Main
+
+if __name__ == "__main__":
+
+    import argparse
+    import sys
+
+    parser = argparse.ArgumentParser(
+        description="Time the rules, self-play and scoring")
+    parser.add_argument('--sizes', type=int, nargs='+', default=list(SIZES))
+    parser.add_argument('--only', default=None,
+        help="run only the benchmarks with this in their name")
+    parser.add_argument('--baseline', default=BASELINE_FILE)
+    parser.add_argument('--save', action='store_true',
+        help="record the results in the baseline")
+    parser.add_argument('--tolerance', type=float, default=TOLERANCE)
+    parser.add_argument('--quick', action='store_true',
+        help="one short timing per benchmark")
+    args = parser.parse_args()
+
+    min_time, repeat = (0.02, 1) if args.quick else (MIN_TIME, REPEAT)
+    results = run_benchmarks(args.sizes, args.only, min_time, repeat)
+    rows, regressions = compare(results, load_baseline(args.baseline),
+        args.tolerance)
+    print(report(rows))
+    if(args.save):
+        save_baseline(results, args.baseline)
+        print("Saved {} results to {}".format(len(results), args.baseline))
+    elif(regressions):
+        print("{} regressions of more than {:.0%}".format(
+            regressions, args.tolerance))
+        sys.exit(1)
@@ -0,0 +1,298 @@
+### Bitboard rules engine for the game of Go
+# Author: Eric Kalosa-Kenyon
+# License: MIT
+#
+# An alternative to groups.Groups with the same interface. Each player's
+# stones are one Python int used as a bit set, with a guard column on the
+# right of every row so that shifting by one never wraps onto the next row.
+# Neighbors, chains, liberties and captures are shifts and masks over whole
+# boards instead of walks over individual points.
+###
+
+## Imports
+
+# 3rd party libraries
+import numpy as np
+
+# Local libraries
+from groups import cached_adjacency
+from zobrist import zobrist_table, PositionIndex
+from history import History
+from symmetry import SymmetricHash
+from patterns import Patterns
+
+## Classes
+
+class Bitboard(object):
+
+    def __init__(self, board):
+        ## Build bitboards for the stones already on <board>
+        # Input
+        #   board : (np.array) square, C-contiguous board of player numbers,
+        #       0 for empty; it is updated in place as stones are played
+
+        self.board = board
+        self.flat = board.reshape(-1) # a view, writes go through to <board>
+        self.size = np.shape(board)[0]
+        self.npoints = self.size * self.size
+        self.adj = cached_adjacency(self.size)
+        self.width = self.size + 1 # one guard column per row
+        self.bits = [1 << (p // self.size * self.width + p % self.size)
+            for p in range(self.npoints)]
+        self.on_board = 0
+        for b in self.bits:
+            self.on_board |= b
+        self.table = zobrist_table(self.npoints)
+        self.hash = 0
+        self.symmetric = None # symmetry.SymmetricHash, see track_symmetries
+        self.patterns = None # patterns.Patterns, see track_patterns
+        self.trackers = [] # told of every stone placed or removed
+        # One entry per stone placed, for undo: the point, the player, the
+        # key before the move and the (chain, player) of each capture
+        self.undo_stack = []
+
+        self.stones = {} # player -> bitboard of that player's stones
+        for p in np.flatnonzero(self.flat).tolist():
+            color = int(self.flat[p])
+            self.stones[color] = self.stones.get(color, 0) | self.bits[p]
+            self.hash ^= self.table[color][p]
+        self.occupied = 0
+        for s in self.stones.values():
+            self.occupied |= s
+
+        # Positions seen so far this game by move number, as in groups.Groups
+        self.moves = History(board) # every stone placed, as deltas
+        self.history = PositionIndex(self.same_position)
+        self.history.add(self.hash, 0)
+
+    def __repr__(self):
+        msg = "<Bitboard: size={}, nstones={}>".format(
+            self.size, bin(self.occupied).count('1'))
+        return(msg)
+
+    def copy(self):
+        # Return an independent Bitboard on a copy of the board
+        other = object.__new__(Bitboard)
+        other.__dict__.update(self.__dict__)
+        other.board = self.board.copy()
+        other.flat = other.board.reshape(-1)
+        other.stones = dict(self.stones)
+        other.moves = self.moves.copy()
+        other.history = self.history.copy(other.same_position)
+        other.undo_stack = [] # moves before the copy cannot be undone on it
+        if(self.symmetric is not None):
+            other.symmetric = self.symmetric.copy()
+        if(self.patterns is not None):
+            other.patterns = self.patterns.copy()
+        other.trackers = [t for t in (other.symmetric, other.patterns)
+            if t is not None]
+        return(other)
+
+    def track_symmetries(self):
+        # Keep the keys of all 8 symmetric variants of the position up to
+        # date from now on, in self.symmetric, for canonical keys
+        self.symmetric = SymmetricHash(self.board)
+        self.trackers.append(self.symmetric)
+        return(self.symmetric)
+
+    def track_patterns(self):
+        # Keep the 3x3 pattern code of every point up to date from now on,
+        # in self.patterns
+        self.patterns = Patterns(self.board)
+        self.trackers.append(self.patterns)
+        return(self.patterns)
+
+    ## Bit set helpers
+
+    def dilate(self, b):
+        # Return <b> together with every point orthogonally next to it
+        w = self.width
+        return((b | b << 1 | b >> 1 | b << w | b >> w) & self.on_board)
+
+    def flood(self, seed, mask):
+        # Return the connected part of <mask> reachable from <seed>
+        while(True):
+            grown = self.dilate(seed) & mask
+            if(grown == seed):
+                return(seed)
+            seed = grown
+
+    def points(self, b):
+        # Return the flat points of the bits set in <b>
+        r = []
+        w, size = self.width, self.size
+        while(b):
+            low = b & -b
+            i = low.bit_length() - 1
+            r.append(i // w * size + i % w)
+            b ^= low
+        return(r)
+
+    def chain_bits(self, p):
+        return(self.flood(self.bits[p], self.stones[self.color(p)]))
+
+    def liberty_bits(self, chain):
+        return(self.dilate(chain) & ~self.occupied & self.on_board)
+
+    ## Same interface as groups.Groups
+
+    def color(self, p):
+        return(int(self.flat[p]))
+
+    def chain(self, p):
+        # Return the flat points of the chain containing the stone at <p>
+        return(self.points(self.chain_bits(p)))
+
+    def liberties(self, p):
+        # Return the set of liberties of the chain containing the stone at <p>
+        return(set(self.points(self.liberty_bits(self.chain_bits(p)))))
+
+    def _captured_bits(self, player, p):
+        # Return one bitboard per enemy chain captured by <player> at <p>
+        pbit = self.bits[p]
+        near = self.dilate(pbit) & self.occupied & ~pbit
+        empty = self.on_board & ~(self.occupied | pbit)
+        r = []
+        for color, stones in self.stones.items():
+            if(color == player):
+                continue
+            todo = near & stones
+            while(todo):
+                chain = self.flood(todo & -todo, stones)
+                todo &= ~chain
+                if(not self.dilate(chain) & empty):
+                    r.append(chain)
+        return(r)
+
+    def captures(self, player, p):
+        # Return one point of each enemy chain that <player> captures at <p>
+        r = []
+        for chain in self._captured_bits(player, p):
+            low = chain & -chain
+            r.append(self.points(low)[0])
+        return(r)
+
+    def is_suicide(self, player, p):
+        # Return whether a stone played by <player> at the empty point <p>
+        # would be left without liberties
+        pbit = self.bits[p]
+        if(self.dilate(pbit) & ~self.occupied & ~pbit):
+            return(False)
+        if(self._captured_bits(player, p)):
+            return(False)
+        own = self.stones.get(player, 0) | pbit
+        chain = self.flood(pbit, own)
+        return(not self.dilate(chain) & ~(self.occupied | pbit) &
+            self.on_board)
+
+    def hash_if_played(self, player, p):
+        # Return the Zobrist key of the position after <player> plays at <p>
+        h = self.hash ^ self.table[player][p]
+        for chain in self._captured_bits(player, p):
+            for s in self.points(chain):
+                h ^= self.table[self.flat[s]][s]
+        return(h)
+
+    def board_if_played(self, player, p):
+        flat = self.flat.copy()
+        flat[p] = player
+        for chain in self._captured_bits(player, p):
+            flat[self.points(chain)] = 0
+        return(flat)
+
+    def same_position(self, n, flat):
+        # Whether the position after the first <n> stones placed is <flat>
+        return(np.array_equal(self.moves.position(n).reshape(-1), flat))
+
+    def repeats(self, player, p):
+        # Return whether <player> playing at <p> recreates an earlier position
+        return(self.history.seen(self.hash_if_played(player, p),
+            lambda: self.board_if_played(player, p)))
+
+    def is_legal(self, player, p):
+        # Return whether <player> may play at <p> (occupation, suicide and
+        # positional superko)
+        return(not self.occupied & self.bits[p] and
+            not self.is_suicide(player, p) and not self.repeats(player, p))
+
+    def ko_point(self, p, captured):
+        # Return the point the opponent may not immediately retake after a
+        # stone at <p> captured <captured>, or None when there is no ko
+        chain = self.chain_bits(p)
+        if(len(captured) == 1 and chain == self.bits[p] and
+                bin(self.liberty_bits(chain)).count('1') == 1):
+            return(captured[0])
+        return(None)
+
+    def chain_if_played(self, player, p):
+        # Return the chain <p> would belong to if <player> played there
+        pbit = self.bits[p]
+        return(self.points(self.flood(pbit, self.stones.get(player, 0) | pbit)))
+
+    def liberties_if_played(self, player, p):
+        # Return the liberties the chain of <p> would have if <player> played
+        # there, ignoring any captures the move would make
+        pbit = self.bits[p]
+        chain = self.flood(pbit, self.stones.get(player, 0) | pbit)
+        libs = self.dilate(chain) & ~(self.occupied | pbit) & self.on_board
+        return(set(self.points(libs)))
+
+    def place(self, player, p):
+        ## Play a stone for <player> at the empty point <p>; undo takes it back
+        # Output
+        #   captured : (list(int)) flat positions of the stones removed
+
+        pbit = self.bits[p]
+        dead = self._captured_bits(player, p)
+        undo = []
+        self.undo_stack.append((p, player, self.hash, undo))
+        self.flat[p] = player
+        self.stones[player] = self.stones.get(player, 0) | pbit
+        self.occupied |= pbit
+        self.hash ^= self.table[player][p]
+        for t in self.trackers:
+            t.toggle(player, p)
+
+        captured = []
+        for chain in dead:
+            undo.append((chain, self.color(self.points(chain & -chain)[0])))
+            for s in self.points(chain):
+                self.hash ^= self.table[self.flat[s]][s]
+                for t in self.trackers:
+                    t.toggle(self.flat[s], s)
+                self.flat[s] = 0
+                captured.append(s)
+            self.occupied &= ~chain
+            for color in self.stones:
+                self.stones[color] &= ~chain
+        self.moves.append(player, p, captured, board=self.board)
+        self.history.add(self.hash, len(self.moves))
+        return(captured)
+
+    def undo(self):
+        ## Take back the last stone placed, putting back what it captured
+        # Output
+        #   p : (int) flat position of the stone taken back
+        #   captured : (list(int)) flat positions of the stones put back
+
+        p, player, key, dead = self.undo_stack.pop()
+        self.history.discard(self.hash, len(self.moves))
+        self.moves.truncate(len(self.moves) - 1)
+        self.hash = key
+        pbit = self.bits[p]
+        self.flat[p] = 0
+        self.stones[player] &= ~pbit
+        self.occupied &= ~pbit
+        for t in self.trackers:
+            t.toggle(player, p)
+
+        captured = []
+        for chain, color in dead:
+            for s in self.points(chain):
+                self.flat[s] = color
+                for t in self.trackers:
+                    t.toggle(color, s)
+                captured.append(s)
+            self.stones[color] |= chain
+            self.occupied |= chain
+        return(p, captured)
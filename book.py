@@ -0,0 +1,184 @@
+### Opening book for the game of Go
+# Author: Eric Kalosa-Kenyon
+# License: MIT
+#
+# Games are replayed through the rules engine and every early position is
+# named by its canonical key (see symmetry.py) together with the player to
+# move, so rotated and mirrored openings share statistics. For each position
+# the book stores every continuation played, also in the canonical
+# orientation, with how often it was played and how often its player won.
+# Entries are kept sorted by key in one numpy structured array, saved with
+# np.save and searched with np.searchsorted, so a lookup is a binary search
+# even when the book is memory-mapped from disk.
+###
+
+## Imports
+
+# Standard libraries
+import random
+
+# 3rd party libraries
+import numpy as np
+
+# Local libraries
+from groups import Groups
+from scoring import score
+from symmetry import canonical, point_maps, inverse
+from zobrist import SEED, MAX_PLAYERS
+from rules import PASS, KOMI
+
+## Parameters
+
+BOOK_MOVES = 20 # Moves of each game entered into the book
+MIN_COUNT = 3 # Times a continuation must have been played to be chosen
+ENTRY = np.dtype([('key', np.uint64), ('move', np.int16),
+    ('count', np.uint32), ('wins', np.uint32)])
+
+_rng = random.Random(SEED - 1)
+TO_MOVE = [0] + [_rng.getrandbits(64) for pl in range(MAX_PLAYERS)]
+
+## Subroutines
+
+def book_key(board, player, symmetric=None):
+    ## Name the position on <board> with <player> to move
+    # Input
+    #   symmetric : (symmetry.SymmetricHash) tracking <board>, if there is
+    #       one, which saves hashing the 8 variants from scratch
+    # Output
+    #   key : (int) canonical key, xor'd with a key for the player to move
+    #   ks : (list(int)) the symmetries taking <board> to its canonical form
+
+    if(symmetric is None):
+        key, ks = canonical(board)
+    else:
+        key, ks = symmetric.canonical()
+    return(key ^ TO_MOVE[player], ks)
+
+def canonical_move(p, ks, size):
+    # Return the move <p> in canonical orientation; when the position is
+    # symmetric the smallest of its equivalent images is used
+    if(p == PASS):
+        return(PASS)
+    maps = point_maps(size)
+    return(min([int(maps[k, p]) for k in ks]))
+
+def build_book(games, size=9, book_moves=BOOK_MOVES, komi=KOMI):
+    ## Collect the opening statistics of a corpus of two-player games
+    # Input
+    #   games : iterable of (size, nplayers, points) e.g. from
+    #       records.iter_games or an archive.Archive; games of another size
+    #       or number of players are skipped
+    #   size : (int) length of a side of the board
+    #   book_moves : (int) moves of each game to enter
+    #   komi : (float) points given to white when deciding the winner
+    # Output
+    #   book : (OpeningBook)
+
+    stats = {} # (key, move) -> [count, wins]
+    for game_size, nplayers, points in games:
+        if(game_size != size or nplayers != 2):
+            continue
+        board = np.zeros((size, size), dtype=np.int8)
+        groups = Groups(board)
+        symmetric = groups.track_symmetries()
+        seen = []
+        for i, p in enumerate(points):
+            player = i % 2 + 1
+            if(i < book_moves):
+                key, ks = book_key(board, player, symmetric)
+                seen.append((key, canonical_move(p, ks, size), player))
+            if(p != PASS):
+                groups.place(player, p)
+        points_1, points_2 = score(board, komi=komi)
+        winner = 1 if points_1 > points_2 else 2
+        for key, move, player in seen:
+            entry = stats.setdefault((key, move), [0, 0])
+            entry[0] += 1
+            entry[1] += player == winner
+
+    entries = np.zeros(len(stats), dtype=ENTRY)
+    for i, ((key, move), (count, wins)) in enumerate(stats.items()):
+        entries[i] = (key, move, count, wins)
+    entries.sort(order=['key', 'move'])
+    return(OpeningBook(entries, size))
+
+## Classes
+
+class OpeningBook(object):
+
+    def __init__(self, entries, size):
+        # <entries> are ENTRY records sorted by key
+        self.entries = entries
+        # A contiguous copy of the keys, which searchsorted needs to be fast
+        self.keys = np.ascontiguousarray(entries['key'])
+        self.size = size
+
+    def __repr__(self):
+        msg = "<OpeningBook: size={}, nentries={}>".format(
+            self.size, len(self.entries))
+        return(msg)
+
+    def __len__(self):
+        return(len(self.entries))
+
+    def save(self, path):
+        # Write the book as an .npy file of ENTRY records
+        np.save(path, self.entries)
+
+    @classmethod
+    def load(cls, path, size=9):
+        # Open a saved book, memory-mapped rather than read into memory
+        return(cls(np.load(path, mmap_mode='r'), size))
+
+    def lookup(self, board, player, symmetric=None):
+        ## Return the book's continuations for <player> on <board>
+        # Input
+        #   symmetric : (symmetry.SymmetricHash) tracking <board>, if any
+        # Output
+        #   moves : (list(tuple(int, int, float))) flat point (PASS for a
+        #       pass) in the orientation of <board>, times played and win rate
+        #       of the player who played it, most played first
+
+        key, ks = book_key(board, player, symmetric)
+        lo = np.searchsorted(self.keys, np.uint64(key), 'left')
+        hi = np.searchsorted(self.keys, np.uint64(key), 'right')
+        back = point_maps(self.size)[inverse(ks[0])]
+        entries = self.entries[lo:hi]
+        moves = []
+        for p, count, wins in zip(entries['move'].tolist(),
+                entries['count'].tolist(), entries['wins'].tolist()):
+            moves.append((PASS if p == PASS else int(back[p]), count,
+                wins / count))
+        moves.sort(key=lambda m: -m[1])
+        return(moves)
+
+    def choose(self, board, player, min_count=MIN_COUNT, symmetric=None):
+        # Return the continuation with the best win rate among those played
+        # at least <min_count> times, or None when the book has none
+        moves = [m for m in self.lookup(board, player, symmetric)
+            if m[1] >= min_count]
+        if(not moves):
+            return(None)
+        return(max(moves, key=lambda m: m[2])[0])
+
+## Main
+
+if __name__ == "__main__":
+
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description="Build an opening book from an archive of games")
+    parser.add_argument('archive', help="games written by archive.py")
+    parser.add_argument('book', help="output .npy file")
+    parser.add_argument('--size', type=int, default=9)
+    parser.add_argument('--moves', type=int, default=BOOK_MOVES)
+    parser.add_argument('--komi', type=float, default=KOMI)
+    args = parser.parse_args()
+
+    from archive import Archive
+    with Archive(args.archive) as games:
+        ngames = len(games)
+        book = build_book(games, args.size, args.moves, args.komi)
+    book.save(args.book)
+    print("{} positions and moves from {} games".format(len(book), ngames))
@@ -0,0 +1,378 @@
+### Incremental chain bookkeeping for the game of Go
+# Author: Eric Kalosa-Kenyon
+# License: MIT
+#
+# Every occupied point belongs to a union-find tree. The root of each tree
+# holds the chain's stones and its set of liberties, so playing a stone only
+# touches the point played, its neighbors, and whatever chains it captures.
+# Each root also holds the xor of its stones' Zobrist keys, so the key of the
+# position after a capture, and hence positional superko, costs O(1).
+# Every stone placed is recorded on an undo stack, so a line of play can be
+# tried and taken back on one board rather than on a copy.
+# Points are addressed by flat, 0-indexed positions into the board i.e.
+# y * size + x.
+###
+
+## Imports
+
+# 3rd party libraries
+import numpy as np
+
+# Local libraries
+from zobrist import zobrist_table, PositionIndex
+from history import History
+from symmetry import SymmetricHash
+from patterns import Patterns
+
+## Subroutines
+
+def adjacency(size):
+    ## Precompute the orthogonal neighbors of every point on a square board
+    # Input
+    #   size : (int) length of a side of the board
+    # Output
+    #   adj : (list(tuple(int))) adj[p] are the flat neighbors of point p
+
+    adj = []
+    for p in range(size * size):
+        y, x = divmod(p, size)
+        ns = []
+        if(y > 0): ns.append(p - size)
+        if(y < size - 1): ns.append(p + size)
+        if(x > 0): ns.append(p - 1)
+        if(x < size - 1): ns.append(p + 1)
+        adj.append(tuple(ns))
+    return(adj)
+
+_adjacency_cache = {}
+
+def cached_adjacency(size):
+    # Adjacency tables are shared between every board of the same size
+    if(size not in _adjacency_cache):
+        _adjacency_cache[size] = adjacency(size)
+    return(_adjacency_cache[size])
+
+## Classes
+
+class Groups(object):
+
+    def __init__(self, board):
+        ## Build the chain structure for the stones already on <board>
+        # Input
+        #   board : (np.array) square, C-contiguous board of player numbers,
+        #       0 for empty; it is updated in place as stones are played
+
+        self.board = board
+        self.flat = board.reshape(-1) # a view, writes go through to <board>
+        self.size = np.shape(board)[0]
+        self.npoints = self.size * self.size
+        self.adj = cached_adjacency(self.size)
+        self.parent = list(range(self.npoints))
+        self.stones = {} # root -> list of flat points in the chain
+        self.libs = {} # root -> set of flat liberties of the chain
+        self.keys = {} # root -> xor of the Zobrist keys of the chain's stones
+        self.table = zobrist_table(self.npoints)
+        self.hash = 0
+        self.symmetric = None # symmetry.SymmetricHash, see track_symmetries
+        self.patterns = None # patterns.Patterns, see track_patterns
+        self.trackers = [] # told of every stone placed or removed
+        # One entry per stone placed, for undo: the point, the player, the
+        # key and the point's parent before the move, and the chains next to
+        # the point as they were
+        self.undo_stack = []
+
+        # Each stone starts as its own chain, then joins its earlier neighbors
+        for p in np.flatnonzero(self.flat).tolist():
+            color = self.flat[p]
+            self.stones[p] = [p]
+            self.libs[p] = set(n for n in self.adj[p] if self.flat[n] == 0)
+            self.keys[p] = self.table[color][p]
+            self.hash ^= self.keys[p]
+            for n in self.adj[p]:
+                if(n < p and self.flat[n] == color):
+                    self._union(p, n)
+
+        # Positions seen so far this game, by move number; on a key collision
+        # the position is rebuilt from the moves and compared exactly
+        self.moves = History(board) # every stone placed, as deltas
+        self.history = PositionIndex(self.same_position)
+        self.history.add(self.hash, 0)
+
+    def __repr__(self):
+        msg = "<Groups: size={}, nchains={}>".format(
+            self.size, len(self.stones))
+        return(msg)
+
+    def copy(self):
+        # Return an independent Groups on a copy of the board, e.g. to try out
+        # a line of play
+        other = object.__new__(Groups)
+        other.__dict__.update(self.__dict__)
+        other.board = self.board.copy()
+        other.flat = other.board.reshape(-1)
+        other.parent = list(self.parent)
+        other.stones = dict((r, list(s)) for r, s in self.stones.items())
+        other.libs = dict((r, set(l)) for r, l in self.libs.items())
+        other.keys = dict(self.keys)
+        other.moves = self.moves.copy()
+        other.history = self.history.copy(other.same_position)
+        other.undo_stack = [] # moves before the copy cannot be undone on it
+        if(self.symmetric is not None):
+            other.symmetric = self.symmetric.copy()
+        if(self.patterns is not None):
+            other.patterns = self.patterns.copy()
+        other.trackers = [t for t in (other.symmetric, other.patterns)
+            if t is not None]
+        return(other)
+
+    def track_symmetries(self):
+        # Keep the keys of all 8 symmetric variants of the position up to
+        # date from now on, in self.symmetric, for canonical keys
+        self.symmetric = SymmetricHash(self.board)
+        self.trackers.append(self.symmetric)
+        return(self.symmetric)
+
+    def track_patterns(self):
+        # Keep the 3x3 pattern code of every point up to date from now on,
+        # in self.patterns
+        self.patterns = Patterns(self.board)
+        self.trackers.append(self.patterns)
+        return(self.patterns)
+
+    def find(self, p):
+        # Return the root of the chain containing the stone at <p>
+        # Union by size keeps the trees shallow without path compression
+        parent = self.parent
+        while(parent[p] != p):
+            p = parent[p]
+        return(p)
+
+    def _union(self, a, b):
+        # Merge the chains containing <a> and <b>, return the new root
+        ra, rb = self.find(a), self.find(b)
+        if(ra == rb):
+            return(ra)
+        if(len(self.stones[ra]) < len(self.stones[rb])):
+            ra, rb = rb, ra
+        self.parent[rb] = ra
+        self.stones[ra].extend(self.stones.pop(rb))
+        # A new set, so that undo can give each chain back its own
+        self.libs[ra] = self.libs[ra] | self.libs.pop(rb)
+        self.keys[ra] ^= self.keys.pop(rb)
+        return(ra)
+
+    def color(self, p):
+        return(int(self.flat[p]))
+
+    def chain(self, p):
+        # Return the flat points of the chain containing the stone at <p>
+        return(self.stones[self.find(p)])
+
+    def liberties(self, p):
+        # Return the set of liberties of the chain containing the stone at <p>
+        return(self.libs[self.find(p)])
+
+    def captures(self, player, p):
+        # Return the roots of the enemy chains that <player> captures by
+        # playing at <p>, i.e. those whose last liberty is (or was) <p>
+        roots = []
+        for n in self.adj[p]:
+            c = self.flat[n]
+            if(c != 0 and c != player):
+                r = self.find(n)
+                libs = self.libs[r]
+                if(not libs or (len(libs) == 1 and p in libs)):
+                    if(r not in roots):
+                        roots.append(r)
+        return(roots)
+
+    def is_suicide(self, player, p):
+        # Return whether a stone played by <player> at the empty point <p>
+        # would be left without liberties
+        for n in self.adj[p]:
+            c = self.flat[n]
+            if(c == 0):
+                return(False)
+            if(c == player):
+                if(len(self.libs[self.find(n)]) > 1):
+                    return(False)
+            elif(len(self.libs[self.find(n)]) == 1):
+                return(False) # the move captures, freeing a liberty
+        return(True)
+
+    def hash_if_played(self, player, p):
+        # Return the Zobrist key of the position after <player> plays at <p>
+        h = self.hash ^ self.table[player][p]
+        for r in self.captures(player, p):
+            h ^= self.keys[r]
+        return(h)
+
+    def board_if_played(self, player, p):
+        # Return the exact position, as a flat array, after <player> plays at
+        # <p>; only needed to settle Zobrist key collisions
+        flat = self.flat.copy()
+        flat[p] = player
+        for r in self.captures(player, p):
+            flat[self.stones[r]] = 0
+        return(flat)
+
+    def same_position(self, n, flat):
+        # Whether the position after the first <n> stones placed is <flat>
+        return(np.array_equal(self.moves.position(n).reshape(-1), flat))
+
+    def repeats(self, player, p):
+        # Return whether <player> playing at <p> recreates an earlier position
+        return(self.history.seen(self.hash_if_played(player, p),
+            lambda: self.board_if_played(player, p)))
+
+    def is_legal(self, player, p):
+        # Return whether <player> may play at <p> (occupation, suicide and
+        # positional superko)
+        return(self.flat[p] == 0 and not self.is_suicide(player, p) and
+            not self.repeats(player, p))
+
+    def ko_point(self, p, captured):
+        # Return the point the opponent may not immediately retake after a
+        # stone at <p> captured <captured>, or None when there is no ko
+        if(len(captured) == 1 and len(self.chain(p)) == 1 and
+                len(self.liberties(p)) == 1):
+            return(captured[0])
+        return(None)
+
+    def chain_if_played(self, player, p):
+        # Return the chain <p> would belong to if <player> played there
+        r = [p]
+        seen = set()
+        for n in self.adj[p]:
+            if(self.flat[n] == player):
+                root = self.find(n)
+                if(root not in seen):
+                    seen.add(root)
+                    r.extend(self.stones[root])
+        return(r)
+
+    def liberties_if_played(self, player, p):
+        # Return the liberties the chain of <p> would have if <player> played
+        # there, ignoring any captures the move would make
+        r = set(n for n in self.adj[p] if self.flat[n] == 0)
+        for n in self.adj[p]:
+            if(self.flat[n] == player):
+                r |= self.libs[self.find(n)]
+        r.discard(p)
+        return(r)
+
+    def place(self, player, p):
+        ## Play a stone for <player> at the empty point <p>; undo takes it back
+        # Input
+        #   player : (int) player number, > 0
+        #   p : (int) flat position of the stone
+        # Output
+        #   captured : (list(int)) flat positions of the stones removed
+
+        adj = self.adj
+        flat = self.flat
+        # Keep the chains next to <p> as they are now, for undo; their stone
+        # lists are only ever extended and their liberty sets replaced
+        saved = []
+        for n in adj[p]:
+            if(flat[n] != 0):
+                r = self.find(n)
+                if(all([r != other[0] for other in saved])):
+                    stones = self.stones[r]
+                    saved.append((r, int(flat[n]), stones, len(stones),
+                        self.libs[r], self.keys[r]))
+        self.undo_stack.append((p, player, self.hash, self.parent[p], saved))
+
+        flat[p] = player
+        self.parent[p] = p
+        self.stones[p] = [p]
+        self.libs[p] = set(n for n in adj[p] if flat[n] == 0)
+        self.keys[p] = self.table[player][p]
+        self.hash ^= self.keys[p]
+        for t in self.trackers:
+            t.toggle(player, p)
+
+        captured = []
+        root = p
+        for n in adj[p]:
+            c = flat[n]
+            if(c == player):
+                root = self._union(root, n)
+            elif(c != 0):
+                r = self.find(n)
+                libs = self.libs[r]
+                libs.discard(p)
+                if(not libs):
+                    captured.extend(self._remove(r))
+        self.libs[self.find(p)].discard(p)
+        self.moves.append(player, p, captured, board=self.board)
+        self.history.add(self.hash, len(self.moves))
+        return(captured)
+
+    def undo(self):
+        ## Take back the last stone placed, putting back what it captured
+        # Output
+        #   p : (int) flat position of the stone taken back
+        #   captured : (list(int)) flat positions of the stones put back
+
+        p, player, key, parent, saved = self.undo_stack.pop()
+        adj = self.adj
+        flat = self.flat
+        self.history.discard(self.hash, len(self.moves))
+        self.moves.truncate(len(self.moves) - 1)
+        self.hash = key
+        # Captured chains are the enemy chains left without liberties
+        dead = [c for c in saved if c[1] != player and not c[4]]
+        for t in self.trackers:
+            t.toggle(player, p)
+            for r, color, stones, n, libs, k in dead:
+                for s in stones:
+                    t.toggle(color, s)
+
+        # Split the chain of <p> back into the chains it was made from
+        r = self.find(p)
+        del self.stones[r], self.libs[r], self.keys[r]
+        flat[p] = 0
+        self.parent[p] = parent # a captured stone's link to its chain
+        for r, color, stones, n, libs, k in saved:
+            self.parent[r] = r
+            del stones[n:]
+            self.stones[r] = stones
+            self.libs[r] = libs
+            self.keys[r] = k
+
+        # Put the captured stones back, taking their points away as
+        # liberties, and give <p> back to the enemy chains as a liberty
+        captured = []
+        for r, color, stones, n, libs, k in dead:
+            captured.extend(stones)
+            for s in stones:
+                for q in adj[s]:
+                    if(flat[q] != 0):
+                        self.libs[self.find(q)].discard(s)
+        for r, color, stones, n, libs, k in dead:
+            for s in stones:
+                flat[s] = color
+        for r, color, stones, n, libs, k in saved:
+            if(color != player):
+                libs.add(p)
+        return(p, captured)
+
+    def _remove(self, root):
+        # Take the chain at <root> off the board, giving its points back as
+        # liberties to the chains next to it; return the points removed
+        adj = self.adj
+        flat = self.flat
+        stones = self.stones.pop(root)
+        del self.libs[root]
+        self.hash ^= self.keys.pop(root)
+        for t in self.trackers:
+            for s in stones:
+                t.toggle(flat[s], s)
+        for s in stones:
+            flat[s] = 0
+        for s in stones:
+            for n in adj[s]:
+                if(flat[n] != 0):
+                    self.libs[self.find(n)].add(s)
+        return(stones)
@@ -0,0 +1,197 @@
+### Delta-encoded move history for the game of Go
+# Author: Eric Kalosa-Kenyon
+# License: MIT
+#
+# Instead of a full board per move, each move is stored as the stone placed,
+# the stones it captured and the resulting ko point, in flat typed arrays.
+# A full copy of the board is kept every <snapshot_every> moves so that any
+# past position can be rebuilt by replaying at most that many deltas.
+###
+
+## Imports
+
+# Standard libraries
+from array import array
+from bisect import bisect_right, insort
+from collections import OrderedDict
+
+# 3rd party libraries
+import numpy as np
+
+## Parameters
+
+SNAPSHOT_EVERY = 32 # Moves between full snapshots of the board
+NO_POINT = -1 # Stored for the point of a pass and for "no ko point"
+CACHE_BYTES = 1 << 20 # Default memory for the boards a ReplayCache keeps
+
+## Classes
+
+class History(object):
+
+    def __init__(self, board, snapshot_every=SNAPSHOT_EVERY):
+        ## Start a history from the position on <board>
+        # Input
+        #   board : (np.array) the position before the first move, copied
+        #   snapshot_every : (int) moves between full snapshots
+
+        self.shape = np.shape(board)
+        self.dtype = board.dtype
+        self.snapshot_every = snapshot_every
+        self.players = array('b') # player of each move
+        self.points = array('h') # flat point played, NO_POINT for a pass
+        self.kos = array('h') # flat ko point after the move, or NO_POINT
+        self.captured = array('h') # flat captured points of all moves
+        self.offsets = array('l', [0]) # move n captured [offsets[n]:[n+1]]
+        self.snapshots = [np.array(board, copy=True)] # every k-th position
+
+    def __repr__(self):
+        msg = "<History: nmoves={}, nsnapshots={}>".format(
+            len(self), len(self.snapshots))
+        return(msg)
+
+    def __len__(self):
+        return(len(self.points))
+
+    def copy(self):
+        # Return an independent history; snapshots are never modified in
+        # place, so they are shared
+        other = object.__new__(History)
+        other.__dict__.update(self.__dict__)
+        for name in ('players', 'points', 'kos', 'captured', 'offsets'):
+            setattr(other, name, array(getattr(self, name).typecode,
+                getattr(self, name)))
+        other.snapshots = list(self.snapshots)
+        return(other)
+
+    def append(self, player, point, captured=(), ko=NO_POINT, board=None):
+        ## Record one move
+        # Input
+        #   player : (int) player number
+        #   point : (int) flat point played, NO_POINT for a pass
+        #   captured : (list(int)) flat points of the stones removed
+        #   ko : (int) flat point the opponent may not retake, or NO_POINT
+        #   board : (np.array) the position after the move; only read, and
+        #       copied, when the move falls on a snapshot
+
+        self.players.append(player)
+        self.points.append(point)
+        self.kos.append(ko)
+        self.captured.extend(captured)
+        self.offsets.append(len(self.captured))
+        n = len(self.points)
+        if(n % self.snapshot_every == 0):
+            if(board is None):
+                board = self.position(n - 1)
+                self.apply(board, n - 1)
+            self.snapshots.append(np.array(board, copy=True))
+
+    def truncate(self, n):
+        # Forget every move after the first <n>, e.g. to branch after undo
+        del self.players[n:]
+        del self.points[n:]
+        del self.kos[n:]
+        del self.captured[self.offsets[n]:]
+        del self.offsets[n + 1:]
+        del self.snapshots[n // self.snapshot_every + 1:]
+
+    def move(self, n):
+        ## Return the <n>th move (0-indexed)
+        # Output
+        #   move : (tuple(int, int, list(int), int)) player, point, captured
+        #       points and ko point
+
+        lo, hi = self.offsets[n], self.offsets[n + 1]
+        return((self.players[n], self.points[n], self.captured[lo:hi].tolist(),
+            self.kos[n]))
+
+    def apply(self, board, n):
+        # Play the <n>th move onto <board> in place
+        flat = board.reshape(-1)
+        if(self.points[n] != NO_POINT):
+            flat[self.points[n]] = self.players[n]
+        for s in self.captured[self.offsets[n]:self.offsets[n + 1]]:
+            flat[s] = 0
+
+    def position(self, n):
+        ## Rebuild the board after the first <n> moves
+        # Output
+        #   board : (np.array) a new array, safe to modify
+
+        if(n < 0 or n > len(self)):
+            raise IndexError("no position after {} of {} moves".format(
+                n, len(self)))
+        k = n // self.snapshot_every
+        board = self.snapshots[k].copy()
+        for m in range(k * self.snapshot_every, n):
+            self.apply(board, m)
+        return(board)
+
+class ReplayCache(object):
+
+    def __init__(self, history, max_bytes=CACHE_BYTES):
+        ## Rebuild positions of <history> through recently used checkpoints
+        # Every position rebuilt is kept as a checkpoint, so moving a few
+        # moves from a recent position replays only those few deltas rather
+        # than everything since the last snapshot. The least recently used
+        # checkpoints are dropped to stay within <max_bytes>.
+        # Input
+        #   history : (History) the moves
+        #   max_bytes : (int) memory for checkpoint boards
+
+        self.history = history
+        self.max_bytes = max_bytes
+        self.boards = OrderedDict() # move number -> board, oldest use first
+        self.numbers = [] # the same move numbers, sorted
+        self.nbytes = 0
+
+    def __repr__(self):
+        msg = "<ReplayCache: ncheckpoints={}, nbytes={}>".format(
+            len(self.boards), self.nbytes)
+        return(msg)
+
+    def __len__(self):
+        return(len(self.boards))
+
+    def position(self, n):
+        ## Rebuild the board after the first <n> moves of the history
+        # Output
+        #   board : (np.array) a new array, safe to modify
+
+        if(n < 0 or n > len(self.history)):
+            raise IndexError("no position after {} of {} moves".format(
+                n, len(self.history)))
+        if(n in self.boards):
+            self.boards.move_to_end(n)
+            return(self.boards[n].copy())
+
+        # Start from the closest checkpoint or snapshot at or before <n>
+        every = self.history.snapshot_every
+        start = n // every * every
+        i = bisect_right(self.numbers, n)
+        if(i > 0 and self.numbers[i - 1] > start):
+            start = self.numbers[i - 1]
+            self.boards.move_to_end(start)
+            board = self.boards[start].copy()
+        else:
+            board = self.history.snapshots[n // every].copy()
+        for m in range(start, n):
+            self.history.apply(board, m)
+        self._keep(n, board.copy())
+        return(board)
+
+    def _keep(self, n, board):
+        if(board.nbytes > self.max_bytes):
+            return
+        self.boards[n] = board
+        insort(self.numbers, n)
+        self.nbytes += board.nbytes
+        while(self.nbytes > self.max_bytes):
+            m, old = self.boards.popitem(last=False)
+            self.numbers.remove(m)
+            self.nbytes -= old.nbytes
+
+    def forget_after(self, n):
+        # Drop the checkpoints past move <n>, e.g. after History.truncate(n)
+        for m in self.numbers[bisect_right(self.numbers, n):]:
+            self.nbytes -= self.boards.pop(m).nbytes
+        del self.numbers[bisect_right(self.numbers, n):]
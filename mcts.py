@@ -0,0 +1,199 @@
+### Monte Carlo tree search player for the game of Go
+# Author: Eric Kalosa-Kenyon
+# License: MIT
+#
+# Search nodes live in a transposition table keyed by (Zobrist hash, player to
+# move, consecutive passes), so positions reached by different move orders
+# share one set of statistics. The table is kept between turns: after each
+# move only the nodes reachable from the new position are kept, which reuses
+# the searched subtree instead of starting over.
+#
+# Only two-player games are supported; player 1 is black, player 2 white.
+###
+
+## Imports
+
+# Standard libraries
+import math
+import random
+import time
+
+# Local libraries
+from playout import Playout
+from patterns import CAPTURE, ESCAPE, CONNECT, CUT
+from rules import PASS, KOMI, candidate_moves
+
+## Parameters
+
+EXPLORATION = 1.4 # UCT exploration constant
+PLAYOUTS = 1000 # Default playouts per move
+
+## Subroutines
+
+def other(player):
+    return(3 - player)
+
+def priority(engine, player, p):
+    # Rank <p> by its local shape: captures and escapes from atari first,
+    # then cuts and connections, then everything else
+    flags = engine.patterns.flags(player, p, engine)
+    if(flags & (CAPTURE | ESCAPE)):
+        return(2)
+    if(flags & (CONNECT | CUT)):
+        return(1)
+    return(0)
+
+## Classes
+
+class Node(object):
+
+    def __init__(self, moves):
+        self.visits = 0
+        self.wins = 0.0 # for the player who moved into this position
+        self.untried = moves # moves not yet expanded, PASS last
+        self.children = {} # move -> key of the resulting node
+
+    def __repr__(self):
+        msg = "<Node: visits={}, wins={}, children={}>".format(
+            self.visits, self.wins, len(self.children))
+        return(msg)
+
+class MCTSPlayer(object):
+
+    def __init__(self, playouts=PLAYOUTS, seconds=None, komi=KOMI,
+            exploration=EXPLORATION, seed=None):
+        ## Computer opponent choosing moves by UCT search
+        # Input
+        #   playouts : (int) playouts per move, or None for no limit
+        #   seconds : (float) time per move, or None for no limit; at least
+        #       one of the two budgets should be set, and at least one
+        #       playout is run whatever they are
+        #   komi : (float) points given to white
+        #   exploration : (float) UCT exploration constant
+        #   seed : (int) seed of the random rollouts
+
+        self.playouts = playouts
+        self.seconds = seconds
+        self.komi = komi
+        self.exploration = exploration
+        self.rng = random.Random(seed)
+        self.table = {} # (hash, player, passes) -> Node
+        self.playouts_by_size = {} # size -> playout.Playout for the rollouts
+
+    def __repr__(self):
+        msg = "<MCTSPlayer: playouts={}, seconds={}, nodes={}>".format(
+            self.playouts, self.seconds, len(self.table))
+        return(msg)
+
+    def node(self, key, engine, player):
+        # Return the node for <key>, creating it if the position is new
+        if(key not in self.table):
+            moves = list(candidate_moves(engine, player))
+            self.rng.shuffle(moves)
+            if(engine.patterns is not None):
+                # Untried moves are expanded from the end of the list
+                moves.sort(key=lambda p: priority(engine, player, p))
+            self.table[key] = Node([PASS] + moves)
+        return(self.table[key])
+
+    def select(self, node):
+        # Return the (move, key) of the child with the best UCT value
+        log_n = math.log(node.visits + 1)
+        best, best_value = None, -1.0
+        for move, key in node.children.items():
+            child = self.table[key]
+            value = child.wins / (child.visits + 1e-9) + self.exploration * \
+                math.sqrt(log_n / (child.visits + 1e-9))
+            if(value > best_value):
+                best, best_value = (move, key), value
+        return(best)
+
+    def simulate(self, engine, player, passes, root):
+        ## Run one playout from the root position, updating the table
+        # Input
+        #   engine : rules engine at the root; the moves played on it are
+        #       taken back before returning
+
+        key = root
+        nplaced = 0
+        path = [key]
+        while(passes < 2):
+            node = self.table[key]
+            if(node.untried):
+                move = node.untried.pop()
+            else:
+                move, key = self.select(node)
+            if(move != PASS and not engine.is_legal(player, move)):
+                # Superko depends on the path, not just the position
+                node.children.pop(move, None)
+                continue
+            if(move == PASS):
+                passes += 1
+            else:
+                passes = 0
+                engine.place(player, move)
+                nplaced += 1
+            player = other(player)
+            key = (engine.hash, player, passes)
+            node.children[move] = key
+            path.append(key)
+            if(key not in self.table):
+                self.node(key, engine, player)
+                break
+
+        if(engine.size not in self.playouts_by_size):
+            self.playouts_by_size[engine.size] = Playout(engine.size,
+                self.rng.getrandbits(32))
+        rollout = self.playouts_by_size[engine.size]
+        rollout.reset(engine.board)
+        winner = 1 if rollout.run(player, passes, self.komi) > 0 else 2
+        for i in range(nplaced):
+            engine.undo()
+
+        # The node reached by a move belongs to the player who made it
+        for key in path:
+            node = self.table[key]
+            node.visits += 1
+            if(winner != key[1]):
+                node.wins += 1
+
+    def choose(self, engine, player, passes=0):
+        ## Search from the position on <engine> and pick a move
+        # Input
+        #   engine : rules engine (groups.Groups or bitboard.Bitboard)
+        #   player : (int) player to move
+        #   passes : (int) consecutive passes just before this move
+        # Output
+        #   move : (int) flat point, or PASS
+
+        engine = engine.copy()
+        if(engine.patterns is None):
+            engine.track_patterns() # shape knowledge to order expansion
+        root = (engine.hash, player, passes)
+        self.node(root, engine, player)
+        deadline = None if self.seconds is None else \
+            time.time() + self.seconds
+        n = 0
+        while(n == 0 or ((self.playouts is None or n < self.playouts) and
+                (deadline is None or time.time() < deadline))):
+            self.simulate(engine, player, passes, root) # at least one
+            n += 1
+
+        children = self.table[root].children
+        if(not children):
+            return(PASS) # the game is over, two passes already
+        move = max(children, key=lambda m: self.table[children[m]].visits)
+        self.prune(children[move])
+        return(move)
+
+    def prune(self, key):
+        # Keep only the nodes reachable from <key>, the position after our move
+        keep = {}
+        todo = [key]
+        while(todo):
+            k = todo.pop()
+            if(k in keep or k not in self.table):
+                continue
+            keep[k] = self.table[k]
+            todo.extend(keep[k].children.values())
+        self.table = keep
@@ -0,0 +1,155 @@
+### 3x3 local patterns for the game of Go
+# Author: Eric Kalosa-Kenyon
+# License: MIT
+#
+# Every point has a 16 bit code for its 8 surrounding points, 2 bits each:
+# 0 empty, 1 and 2 the players' stones, 3 off the board. Playing or removing
+# a stone changes the codes of its 8 neighbors by one xor each, so the codes
+# of a whole board are kept up to date as a game goes on. Four more bits mark
+# which orthogonal neighbors belong to chains in atari; those come from the
+# rules engine when a point is looked up. The 20 bit code then indexes a
+# precomputed table of what the shape means for the player to move.
+###
+
+## Imports
+
+# 3rd party libraries
+import numpy as np
+
+## Parameters
+
+EDGE = 3 # Code of a point off the board
+# The 8 surrounding points, clockwise from north; orthogonal ones are even
+RING = ((-1, 0), (-1, 1), (0, 1), (1, 1), (1, 0), (1, -1), (0, -1), (-1, -1))
+ORTHOGONAL = (0, 2, 4, 6) # indices into RING
+NPLAYERS = 2
+
+# Flags in the tables, for the player to move at an empty point
+EYE = 1 # an eye of the player's: playing there fills it
+CAPTURE = 2 # takes an enemy chain in atari
+ESCAPE = 4 # extends one of the player's chains in atari
+CONNECT = 8 # joins own stones that are not locally connected
+CUT = 16 # separates enemy stones that are not locally connected
+
+## Subroutines
+
+def ring_points(size):
+    ## Precompute the 8 surrounding points of every point
+    # Output
+    #   ring : (list(tuple(int))) ring[p][i] is the flat point in direction
+    #       RING[i] from p, or -1 off the board
+
+    ring = []
+    for p in range(size * size):
+        y, x = divmod(p, size)
+        ring.append(tuple([(y + dy) * size + x + dx
+            if 0 <= y + dy < size and 0 <= x + dx < size else -1
+            for dy, dx in RING]))
+    return(ring)
+
+def pattern_code(board, p):
+    # Return the 16 bit code of the 8 points around <p>, from scratch
+    flat = np.asarray(board).reshape(-1)
+    code = 0
+    for i, q in enumerate(ring_points(np.shape(board)[-1])[p]):
+        code |= (EDGE if q < 0 else int(flat[q])) << 2 * i
+    return(code)
+
+def _groups(mine):
+    # Count the separate groups of the orthogonal points marked in <mine>,
+    # shaped (8, ncodes), that are connected through the 8 surrounding points
+    n = sum(mine[i] for i in ORTHOGONAL).astype(np.int8)
+    for i in ORTHOGONAL:
+        n -= mine[i] & mine[(i + 1) % 8] & mine[(i + 2) % 8]
+    return(n + mine.all(axis=0))
+
+_tables = {}
+
+def pattern_table(nplayers=NPLAYERS):
+    ## Build the flags of every 20 bit code for every player
+    # Output
+    #   table : (np.array(uint8)) shaped (nplayers + 1, 2^20), table[player]
+    #       [code | atari << 16] holds the flags above
+
+    if(nplayers in _tables):
+        return(_tables[nplayers])
+    codes = np.arange(1 << 16)
+    colors = np.stack([(codes >> 2 * i) & 3 for i in range(8)])
+    orth = colors[list(ORTHOGONAL)]
+    diag = colors[[1, 3, 5, 7]]
+    off_board = (diag == EDGE).any(axis=0)
+    atari = np.arange(16)[:, None] # the 4 atari bits, above the 16 of shape
+    weights = (1 << np.arange(4))[:, None]
+
+    table = np.zeros((nplayers + 1, 16, len(codes)), dtype=np.uint8)
+    for player in range(1, nplayers + 1):
+        own = colors == player
+        enemy = (colors != player) & (colors != 0) & (colors != EDGE)
+        bad = (diag != player) & (diag != 0) & (diag != EDGE)
+        eye = ((orth == player) | (orth == EDGE)).all(axis=0) & \
+            (bad.sum(axis=0) < np.where(off_board, 1, 2))
+        shape = np.where(eye, EYE, 0)
+        shape |= np.where(_groups(own) >= 2, CONNECT, 0)
+        shape |= np.where(_groups(enemy) >= 2, CUT, 0)
+        own_bits = (own[list(ORTHOGONAL)] * weights).sum(axis=0)
+        enemy_bits = (enemy[list(ORTHOGONAL)] * weights).sum(axis=0)
+        table[player] = shape | np.where(atari & enemy_bits, CAPTURE, 0) | \
+            np.where(atari & own_bits, ESCAPE, 0)
+    _tables[nplayers] = table.reshape(nplayers + 1, -1)
+    return(_tables[nplayers])
+
+## Classes
+
+class Patterns(object):
+
+    def __init__(self, board, nplayers=NPLAYERS):
+        ## Start tracking the 3x3 codes of every point on <board>
+        # Input
+        #   board : (np.array) square board of player numbers, 0 for empty
+
+        size = np.shape(board)[-1]
+        self.ring = ring_points(size)
+        self.codes = [pattern_code(board, p) for p in range(size * size)]
+        self.table = pattern_table(nplayers)
+        # For each point, the (neighbor, shift) pairs whose codes it is in
+        self.watchers = [[] for p in range(size * size)]
+        for q in range(size * size):
+            for i, p in enumerate(self.ring[q]):
+                if(p >= 0):
+                    self.watchers[p].append((q, 2 * i))
+
+    def __repr__(self):
+        msg = "<Patterns: npoints={}>".format(len(self.codes))
+        return(msg)
+
+    def copy(self):
+        other = object.__new__(Patterns)
+        other.__dict__.update(self.__dict__)
+        other.codes = list(self.codes)
+        return(other)
+
+    def toggle(self, player, p):
+        # Add or remove a stone of <player> at <p>
+        codes = self.codes
+        player = int(player)
+        for q, shift in self.watchers[p]:
+            codes[q] ^= player << shift
+
+    def atari_bits(self, engine, p):
+        # Return the 4 bits of the orthogonal neighbors of <p> whose chains
+        # <engine> has in atari
+        bits = 0
+        for i in range(4):
+            q = self.ring[p][ORTHOGONAL[i]]
+            if(q >= 0 and engine.flat[q] != 0 and
+                    len(engine.liberties(q)) == 1):
+                bits |= 1 << i
+        return(bits)
+
+    def flags(self, player, p, engine=None):
+        # Return the flags of the empty point <p> for <player>; the CAPTURE
+        # and ESCAPE flags need the <engine> to tell which chains are in atari
+        code = self.codes[p]
+        if(engine is not None):
+            code |= self.atari_bits(engine, p) << 16
+        return(int(self.table[player][code]))
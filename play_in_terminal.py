@@ -20,6 +20,12 @@ import pdb
 
 # Local libraries
 import utils
+from groups import cached_adjacency
+from rules import ENGINES, BACKEND, KOMI, PASS as NO_MOVE
+from mcts import MCTSPlayer
+from book import OpeningBook, BOOK_MOVES
+import scoring
+import records
 
 ## Preamble
 
@@ -29,12 +35,21 @@ log.debug("Libraries successfully imported")
 ## Parameterize game
 
 PASS = 'p'
-MOVE_INSTRUCTIONS = "'Y X' or '{}' for pass".format(PASS)
+UNDO = 'u'
+MOVE_INSTRUCTIONS = "'Y X', '{}' for pass or '{}' to take back a move".format(
+    PASS, UNDO)
 BOARD_SIZE = 9 # Make an X by X sized go board
 DIMENSIONS = 2 # Dimensionality of the board, if not 2, YMMV
 PLAYERS = 2 # Players, usually 2, if more or less YMMV
-log.debug("Playing on board size {}^{} with {} players".format(
-    BOARD_SIZE, DIMENSIONS, PLAYERS))
+COMPUTER_PLAYERS = [] # Players moved by mcts.MCTSPlayer, e.g. [2]
+COMPUTER_SECONDS = 5 # Search time per computer move
+BOOK_FILE = None # Opening book for computer players, built by book.py
+SCORING = scoring.AREA # Scoring rule: scoring.AREA or scoring.TERRITORY
+DEAD_STONES = False # Remove chains estimated dead before scoring, a heuristic
+GAMES_FILE = 'games.rec' # Finished games are appended here, see records.py
+SGF_FILE = 'last-game.sgf' # The last finished game, for other Go programs
+log.debug("Playing on board size {}^{} with {} players using {}".format(
+    BOARD_SIZE, DIMENSIONS, PLAYERS, BACKEND))
 
 ## Setup the game
 
@@ -42,7 +57,14 @@ game_over = False
 player = 1
 shape = [BOARD_SIZE for b in range(DIMENSIONS)]
 board = np.zeros(shape, dtype=np.int8)
-boards = []
+engine = ENGINES[BACKEND](board)
+# Computer players judge their playouts by area whatever SCORING is, which
+# is close to territory scoring but can differ by a point
+computers = dict([(p, MCTSPlayer(playouts=None, seconds=COMPUTER_SECONDS,
+    komi=KOMI)) for p in COMPUTER_PLAYERS])
+book = None if BOOK_FILE is None else OpeningBook.load(BOOK_FILE, BOARD_SIZE)
+if(book is not None):
+    engine.track_symmetries() # canonical keys for book lookups
 move = None
 moves = []
 cap_stones = np.zeros((PLAYERS, PLAYERS))
@@ -69,89 +91,215 @@ def endgame(moves):
     were_pass = [l[1] == PASS for l in last_moves]
     return(all(were_pass))
 
+@utils.profiled
+def computer_input(computer, player, moves):
+    ## Ask a computer player for its move, from the opening book if it has
+    # one for the position
+    # Input
+    #   computer : (mcts.MCTSPlayer) searcher for <player>
+    #   player : (int) player to move
+    #   moves : (list(tuple(int, move))) moves already played
+    # Output
+    #   user_input : (str) 'Y X' or PASS, as a human would type it
+
+    point = None
+    if(book is not None and len(moves) < BOOK_MOVES):
+        point = book.choose(board, player, symmetric=engine.symmetric)
+        if(point is not None and point != NO_MOVE and
+                not engine.is_legal(player, point)):
+            point = None
+    if(point is None):
+        passes = 0
+        for mv in reversed(moves):
+            if(mv[1] != PASS):
+                break
+            passes += 1
+        point = computer.choose(engine, player, passes)
+    if(point == NO_MOVE):
+        return(PASS)
+    return("{} {}".format(*[i + 1 for i in divmod(point, BOARD_SIZE)]))
+
+def take_back(moves, engine, cap_stones, computers=()):
+    ## Take back the last move, and the ones before it until a human player
+    # is to move or no moves are left, putting back the stones they captured
+    # Input
+    #   moves : (list(tuple(int, move))) moves played, shortened in place
+    #   engine : the game's rules engine, whose stones are taken back
+    #   cap_stones : (np.array) stones captured, by capturer and captured
+    #       player, updated in place
+    #   computers : players moved by the computer
+    # Output
+    #   taken : (list(tuple(int, move))) the moves taken back, last first;
+    #       the player of the last one is to move
+
+    taken = []
+    while(moves and (not taken or taken[-1][0] in computers)):
+        player, move = moves.pop()
+        if move != PASS:
+            point, captures = engine.undo()
+            for s in captures:
+                cap_stones[player - 1, engine.flat[s] - 1] -= 1
+        taken.append((player, move))
+    return(taken)
+
+@utils.profiled
+def score_game(board, prisoners=None, dead=False):
+    ## Score the final position on <board>
+    # Input
+    #   board : (np.array) the board at the end of the game
+    #   prisoners : (np.array) stones captured by each player, by default
+    #       totalled from cap_stones; counted under TERRITORY scoring
+    #   dead : (bool) whether to remove the stones scoring.dead_stones
+    #       estimates are dead, a rough guess; off unless asked for
+    # Output
+    #   score : (np.array(float)) points of players 1, 2, .., PLAYERS
+
+    if(prisoners is None):
+        prisoners = cap_stones.sum(axis=1)
+    return(scoring.score(board, PLAYERS, SCORING, KOMI, prisoners, dead))
+
+def save_game(moves, score=None, path=GAMES_FILE, sgf_path=SGF_FILE):
+    ## Append the game to the binary record file and write it as SGF
+    # Input
+    #   moves : (list(tuple(int, move))) moves played
+    #   score : (np.array) output of score_game, recorded in the SGF
+    #   path : (str) binary record file, see records.py
+    #   sgf_path : (str) SGF file, overwritten; None to skip, and skipped
+    #       unless there are two players
+
+    points = [records.PASS if mv[1] == PASS else to_point(mv[1][1], BOARD_SIZE)
+        for mv in moves]
+    records.append_game(path, points, BOARD_SIZE, PLAYERS)
+    if(sgf_path is not None and PLAYERS == 2):
+        result = None
+        if(score is not None):
+            margin = score[0] - score[1]
+            result = "0" if margin == 0 else "{}+{}".format(
+                "B" if margin > 0 else "W", abs(margin))
+        with open(sgf_path, 'w') as f:
+            f.write(records.to_sgf(points, BOARD_SIZE, KOMI, result))
+
+def load_games(path=GAMES_FILE):
+    # Stream the games saved by save_game as lists of (player, move) like
+    # <moves> in the main loop
+    for size, nplayers, points in records.iter_games(path):
+        yield([(i % nplayers + 1, PASS if p == records.PASS else
+            (i % nplayers + 1, to_location(p, size)))
+            for i, p in enumerate(points)])
+
+def to_point(loc, size):
+    # Convert a 1-indexed [Y, X] location to a flat, 0-indexed point
+    return((loc[0] - 1) * size + loc[1] - 1)
+
+def to_location(p, size):
+    # Convert a flat, 0-indexed point to a 1-indexed [Y, X] location
+    return([p // size + 1, p % size + 1])
+
+def engine_of(board):
+    # Return the rules engine for <board>, building one of type BACKEND when
+    # <board> is a bare array; the main loop keeps one engine alive for the
+    # whole game so that moves only cost what they touch
+    if(is_engine(board)):
+        return(board)
+    return(ENGINES[BACKEND](board))
+
+def is_engine(board):
+    # Whether <board> is a rules engine rather than a bare array
+    return(isinstance(board, tuple(ENGINES.values())))
+
+def size_of(board):
+    # Return the length of a side of <board>, an engine or a bare array
+    return(board.size if is_engine(board) else np.shape(board)[1])
+
+@utils.profiled
 def neighbors(move, board):
     # Return the positions of neighbors of a stone, handles edge cases
     # Note: moves are (int, [Y, X])
     # NOTE: only works for 2 Dimensions
 
-    y, x = move[1]
-    m = np.shape(board)[1]
-    r = None
-
-    # corners
-    if(x == 1 and y == 1):
-        r = [[1,2], [2,1]]
-    elif(x == 1 and y == m):
-        r = [[m-1,1], [m,2]]
-    elif(x == m and y == 1):
-        r = [[2,m], [1,m-1]]
-    elif(x == m and y == m):
-        r = [[m,m-1], [m-1,m]]
-
-    # sides
-    if(x == 1):
-        r = [[y+1,1], [y-1,1], [y,2]]
-    elif(x == m):
-        r = [[y+1,m], [y-1,m], [y,m-1]]
-    elif(y == 1):
-        r = [[y,x-1], [y,x+1], [y+1,x]]
-    elif(y == m):
-        r = [[y,x-1], [y,x+1], [y-1,x]]
-
-    else:
-        r = [[y+1,x], [y-1,x], [y,x+1], [y,x-1]]
+    m = size_of(board)
+    p = to_point(move[1], m)
+    r = [to_location(n, m) for n in cached_adjacency(m)[p]]
 
     # log.debug("Neighbors of <{}> are <{}>".format(move, r))
 
     return(r)
 
+@utils.profiled
 def chain(move, board):
-    # TODO
     # Return the locations of the chain of stones connected to the stone placed
-    #   in <move>
-    pass
+    #   in <move>, whether or not it is on the board yet
+
+    g = engine_of(board)
+    p = to_point(move[1], g.size)
+    if(g.color(p) == move[0]):
+        points = g.chain(p)
+    else:
+        points = g.chain_if_played(move[0], p)
+    return([to_location(s, g.size) for s in points])
 
 def stone_liberties(move, board):
-    # Return the number of liberties of a single stone placed on the board
-    pdb.set_trace()
-    return(sum([move[0] == n[0] for n in neighbors(move=move, board=board)]))
+    # Return the number of liberties of a single stone placed on the board,
+    # read straight from the array when <board> is not an engine
+    m = size_of(board)
+    p = to_point(move[1], m)
+    flat = board.flat if is_engine(board) else np.asarray(board).reshape(-1)
+    return(sum([flat[n] == 0 for n in cached_adjacency(m)[p]]))
+
+@utils.profiled
+def liberties(move, board):
+    # Return the number of liberties of the chain of stones connected to the
+    #   stone placed in <move>, whether or not it is on the board yet
+
+    g = engine_of(board)
+    p = to_point(move[1], g.size)
+    if(g.color(p) == move[0]):
+        return(len(g.liberties(p)))
+    return(len(g.liberties_if_played(move[0], p)))
 
 def chain_liberties(move, board):
     # Return the number of liberties of a chain of stones placed on the board
-    return(sum([stone_liberties(s) for s in chain(move=move, board=board)]))
+    return(liberties(move=move, board=board))
 
+@utils.profiled
 def captured(move, board):
-    # NOTE will only work properly for 2 players right now
     # Return the stones captured by playing <move> on <board>
     # return = list of lists e.g. [(2, [1,1]), (2, [1,2])]
 
+    g = engine_of(board)
+    p = to_point(move[1], g.size)
     r = []
-    for n in neighbors(move=move, board=board):
-        if(not n[0] == move[0]): # if it's not your stone
-            if(stone_liberties(move=n, board=board) == 0): # and it's dead
-                r += chain(board=board, move=n) # add its chain to return
+    for root in g.captures(move[0], p):
+        color = g.color(root)
+        r += [(color, to_location(s, g.size)) for s in g.chain(root)]
     return r
 
+@utils.profiled
 def valid_move(move, board):
 
     ## Determine whether <move> is valid
     # Input
     #   move : (int, [int, int]) player plays stone at [int, int, ..]
-    #   board : (np.array) the current state of the board
+    #   board : (np.array or engine) the current state of the board
     # Output
     #   valid : (bool) whther the move is valid or not
 
+    g = engine_of(board)
+    p = to_point(move[1], g.size)
+
     # Occupied spot cannot be twice occupied
     # i.e cannot play on a stone already there
-
-    move_loc = [m - 1 for m in move[1]]
-    board_at_loc = board[tuple(move_loc)]
-    if(board_at_loc != 0):
+    if(g.color(p) != 0):
         return False
 
-    # TODO
     # Cannot kill self or own stones
-    # Cannot return board to previous state
+    if(g.is_suicide(move[0], p)):
+        return False
+
+    # Cannot return board to previous state (positional superko), looked up
+    # by Zobrist key in the positions the engine has seen this game
+    if(g.repeats(move[0], p)):
+        return False
 
     return True
 
@@ -172,10 +320,26 @@ if __name__ == "__main__":
             turn, player))
         print("Player {}: please select a move {}".format(
             player, MOVE_INSTRUCTIONS))
-        user_input = input()
+        if player in computers:
+            user_input = computer_input(computers[player], player, moves)
+            print(user_input)
+        else:
+            user_input = input()
         log.debug("Player {} gave input <{}>".format(
             player, user_input))
 
+        # Take back the last move, and the computers' moves before it, so
+        # that a human is to move again
+        if user_input == UNDO:
+            if(not moves):
+                print("There are no moves to take back")
+                continue
+            taken = take_back(moves, engine, cap_stones, computers)
+            player = taken[-1][0]
+            turn = turn - len(taken)
+            log.debug("Took back moves <{}>".format(taken))
+            continue
+
         # Determine whether it's a valid input
         if user_input == PASS:
             move = PASS
@@ -197,14 +361,13 @@ if __name__ == "__main__":
 
         ## Determine whether move is valid and play it if it is
         if move != PASS:
-            if valid_move(board=board, move=move):
-                # Put stone on board
-                board[tuple([m - 1 for m in move[1]])] = move[0]
-                # Remove captured stones
-                for mv in captured(board=board, move=move):
-                    cap_stones[player, mv[0]] += 1 # record the capture
-                    mvloc = tuple([m-1 for m in mv[1]])
-                    board[mvloc] = 0
+            if valid_move(board=engine, move=move):
+                # Record the captures, then put the stone on the board, which
+                # removes the captured stones; the engine keeps the moves
+                # for undo and superko
+                for mv in captured(board=engine, move=move):
+                    cap_stones[player - 1, mv[0] - 1] += 1
+                engine.place(player, to_point(move[1], BOARD_SIZE))
             else:
                 print("Invalid move: <{}>, please try another".format(
                     user_input))
@@ -212,7 +375,6 @@ if __name__ == "__main__":
 
         # Update the game log
         moves.append((player, move))
-        boards.append(board)
 
         # Determine whether endgame conditions are met and act accordingly
         if(endgame(moves)):
@@ -224,12 +386,13 @@ if __name__ == "__main__":
         player = (player % PLAYERS) + 1
         turn = turn + 1
 
-    sys.exit(0)
-    # TODO
     # Calculate and report score
-    score = score_game(board)
+    score = score_game(board, dead=DEAD_STONES)
     log.debug("Game score is {}".format(score))
+    for p in range(PLAYERS):
+        print("Player {}: {} points".format(p + 1, score[p]))
 
     # Save game to disk
     log.debug("Saving game")
-    save_game(moves)
+    save_game(moves, score)
+    sys.exit(0)
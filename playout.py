@@ -0,0 +1,297 @@
+### Fast random playouts for the game of Go
+# Author: Eric Kalosa-Kenyon
+# License: MIT
+#
+# A stripped down rules engine for playing random games to the end as quickly
+# as plain Python allows. All state lives in lists allocated once per board
+# size and overwritten in place, so a playout allocates nothing per move.
+# Chains are circular linked lists of their stones; each chain keeps pseudo
+# liberties (one per stone and empty neighbor pair) as a count, a sum and a
+# sum of squares, which is enough to tell when the chain has no liberties or
+# exactly one without keeping liberty sets. Only simple ko is enforced, as is
+# usual for rollouts.
+###
+
+## Imports
+
+# Standard libraries
+import random
+
+# Local libraries
+from groups import cached_adjacency
+from rules import PASS, NO_KO
+
+## Parameters
+
+MAX_MOVES_FACTOR = 3 # Playouts stop after this many moves per board point
+
+## Classes
+
+class Playout(object):
+
+    def __init__(self, size, seed=None):
+        ## Preallocate the buffers for random games on <size> by <size> boards
+        # Input
+        #   size : (int) length of a side of the board
+        #   seed : (int) seed of the random moves
+
+        n = size * size
+        self.size = size
+        self.npoints = n
+        self.max_moves = MAX_MOVES_FACTOR * n
+        self.adj = cached_adjacency(size)
+        self.rng = random.Random(seed)
+        self.color = [0] * n # player at each point, 0 for empty
+        self.head = [0] * n # representative stone of each stone's chain
+        self.next = [0] * n # next stone in the same chain, circularly
+        self.nstones = [0] * n # per head: stones in the chain
+        self.libs = [0] * n # per head: pseudo liberty count
+        self.lsum = [0] * n # per head: sum of pseudo liberty points
+        self.lsq = [0] * n # per head: sum of squares of the same
+        self.empty = list(range(n)) # empty points, the first nempty entries
+        self.where = list(range(n)) # index of each empty point in <empty>
+        self.nempty = n
+        self.ko = NO_KO
+        self._zeros = [0] * n
+
+    def __repr__(self):
+        msg = "<Playout: size={}, nempty={}>".format(self.size, self.nempty)
+        return(msg)
+
+    def reset(self, board=None, ko=NO_KO):
+        ## Set up the position on <board>, or an empty board
+        # Input
+        #   board : (np.array) square board of player numbers, 0 for empty
+        #   ko : (int) flat point the player to move may not play, or NO_KO
+
+        color, head, nxt = self.color, self.head, self.next
+        if(board is None):
+            color[:] = self._zeros
+        else:
+            color[:] = board.reshape(-1).tolist()
+        self.nempty = 0
+        for p in range(self.npoints):
+            if(color[p] == 0):
+                self.where[p] = self.nempty
+                self.empty[self.nempty] = p
+                self.nempty += 1
+                continue
+            head[p] = nxt[p] = p
+            self.nstones[p] = 1
+            self.libs[p] = self.lsum[p] = self.lsq[p] = 0
+            for q in self.adj[p]:
+                if(color[q] == 0):
+                    self._add_liberty(p, q)
+        for p in range(self.npoints):
+            if(color[p] != 0):
+                for q in self.adj[p]:
+                    if(q < p and color[q] == color[p] and head[q] != head[p]):
+                        self._merge(head[p], head[q])
+        self.ko = ko
+
+    ## Chain bookkeeping
+
+    def _add_liberty(self, h, p):
+        self.libs[h] += 1
+        self.lsum[h] += p
+        self.lsq[h] += p * p
+
+    def _remove_liberty(self, h, p):
+        self.libs[h] -= 1
+        self.lsum[h] -= p
+        self.lsq[h] -= p * p
+
+    def in_atari(self, h):
+        # Whether the chain with head <h> has exactly one liberty: all its
+        # pseudo liberties are then the same point, so sum^2 == count * sum_sq
+        return(self.libs[h] > 0 and
+            self.lsum[h] * self.lsum[h] == self.libs[h] * self.lsq[h])
+
+    def _merge(self, a, b):
+        # Join the chains with heads <a> and <b>, relabelling the smaller
+        if(self.nstones[a] < self.nstones[b]):
+            a, b = b, a
+        head, nxt = self.head, self.next
+        s = b
+        while(True):
+            head[s] = a
+            s = nxt[s]
+            if(s == b):
+                break
+        nxt[a], nxt[b] = nxt[b], nxt[a]
+        self.nstones[a] += self.nstones[b]
+        self.libs[a] += self.libs[b]
+        self.lsum[a] += self.lsum[b]
+        self.lsq[a] += self.lsq[b]
+        return(a)
+
+    def _capture(self, h):
+        # Remove the chain with head <h>, giving its points back as liberties
+        # to the chains around it; returns the number of stones removed
+        color, head, nxt, adj = self.color, self.head, self.next, self.adj
+        s = h
+        while(True):
+            color[s] = 0
+            self.where[s] = self.nempty
+            self.empty[self.nempty] = s
+            self.nempty += 1
+            s = nxt[s]
+            if(s == h):
+                break
+        while(True):
+            for q in adj[s]:
+                if(color[q] != 0):
+                    self._add_liberty(head[q], s)
+            s = nxt[s]
+            if(s == h):
+                break
+        return(self.nstones[h])
+
+    ## Moves
+
+    def is_legal(self, player, p):
+        # Whether <player> may play at the empty point <p>
+        if(p == self.ko):
+            return(False)
+        color, head = self.color, self.head
+        for q in self.adj[p]:
+            c = color[q]
+            if(c == 0):
+                return(True)
+            if((c == player) != self.in_atari(head[q])):
+                return(True) # a safe friendly chain, or a capture
+        return(False)
+
+    def is_eye(self, player, p):
+        # Whether every neighbor of <p> is one of <player>'s stones
+        color = self.color
+        for q in self.adj[p]:
+            if(color[q] != player):
+                return(False)
+        return(True)
+
+    def place(self, player, p):
+        # Play a stone for <player> at the legal point <p>; the liberty
+        # updates of _add_liberty and _remove_liberty are inlined here
+        color, head, nxt, adj = self.color, self.head, self.next, self.adj
+        libs, lsum, lsq = self.libs, self.lsum, self.lsq
+
+        # Take <p> out of the empty points
+        self.nempty -= 1
+        last = self.empty[self.nempty]
+        self.empty[self.where[p]] = last
+        self.where[last] = self.where[p]
+
+        color[p] = player
+        head[p] = nxt[p] = p
+        self.nstones[p] = 1
+        n = s1 = s2 = 0
+        pp = p * p
+        for q in adj[p]:
+            if(color[q] == 0):
+                n += 1
+                s1 += q
+                s2 += q * q
+            else:
+                h = head[q]
+                libs[h] -= 1
+                lsum[h] -= p
+                lsq[h] -= pp
+        libs[p], lsum[p], lsq[p] = n, s1, s2
+
+        h = p
+        captured, ko = 0, NO_KO
+        for q in adj[p]:
+            c = color[q]
+            if(c == player):
+                if(head[q] != h):
+                    h = self._merge(h, head[q])
+            elif(c != 0 and libs[head[q]] == 0):
+                captured += self._capture(head[q])
+                ko = q
+
+        # A lone stone that took a lone stone and has one liberty is a ko
+        if(captured == 1 and self.nstones[h] == 1 and libs[h] == 1):
+            self.ko = ko
+        else:
+            self.ko = NO_KO
+
+    def random_move(self, player):
+        # Return a uniformly random legal move for <player> that does not
+        # fill its own eye, or PASS; points found unplayable are swapped past
+        # the end of the candidates so each is tried at most once. The checks
+        # of is_eye and is_legal are inlined here
+        empty, where = self.empty, self.where
+        color, head, adj = self.color, self.head, self.adj
+        libs, lsum, lsq = self.libs, self.lsum, self.lsq
+        rand = self.rng.random
+        ko = self.ko
+        n = self.nempty
+        while(n > 0):
+            i = int(rand() * n)
+            p = empty[i]
+            if(p != ko):
+                eye, legal = True, False
+                for q in adj[p]:
+                    c = color[q]
+                    if(c != player):
+                        eye = False
+                    if(c == 0):
+                        legal = True
+                    elif(not legal):
+                        h = head[q]
+                        atari = lsum[h] * lsum[h] == libs[h] * lsq[h]
+                        legal = (c == player) != atari
+                if(legal and not eye):
+                    return(p)
+            n -= 1
+            q = empty[n]
+            empty[i], empty[n] = q, p
+            where[q], where[p] = i, n
+        return(PASS)
+
+    def score(self, komi=0.0):
+        ## Score the position by area
+        # Empty points count for a player when all their neighbors are that
+        # player's stones, which is how random play leaves its eyes
+        # Output
+        #   margin : (float) player 1's area minus player 2's area and komi
+
+        color, adj = self.color, self.adj
+        score = -komi
+        for p in range(self.npoints):
+            c = color[p]
+            if(c == 0):
+                c = color[adj[p][0]]
+                for q in adj[p]:
+                    if(color[q] != c):
+                        c = 0
+                        break
+            if(c == 1):
+                score += 1
+            elif(c == 2):
+                score -= 1
+        return(score)
+
+    def run(self, player=1, passes=0, komi=0.0):
+        ## Play random moves from the current position until two passes in a
+        # row, as endgame() in play_in_terminal.py, or the move limit
+        # Input
+        #   player : (int) player to move, 1 or 2
+        #   passes : (int) consecutive passes just before this move
+        #   komi : (float) points given to player 2
+        # Output
+        #   margin : (float) final area score, see score()
+
+        nmoves = 0
+        while(passes < 2 and nmoves < self.max_moves):
+            p = self.random_move(player)
+            if(p == PASS):
+                passes += 1
+                self.ko = NO_KO
+            else:
+                passes = 0
+                self.place(player, p)
+            player = 3 - player
+            nmoves += 1
+        return(self.score(komi))
@@ -0,0 +1,148 @@
+### Game records for the game of Go
+# Author: Eric Kalosa-Kenyon
+# License: MIT
+#
+# Games are sequences of flat, 0-indexed points (PASS for a pass) played by
+# players 1, 2, .., nplayers in turn, as in batch.py and selfplay.py. They
+# can be written as SGF for other Go programs, or appended to a compact
+# binary file of records:
+#
+#   uint32 nmoves | uint8 size | uint8 nplayers | nmoves moves
+#
+# all little-endian, where each move takes one byte on boards of up to 15x15
+# and two bytes on larger boards, and a pass is the largest value that fits.
+# Records are only ever appended, and read back one game at a time.
+###
+
+## Imports
+
+# Standard libraries
+import re
+import struct
+import sys
+from array import array
+
+# Local libraries
+from rules import PASS
+
+## Parameters
+
+HEADER = struct.Struct('<IBB') # nmoves, size, nplayers
+SGF_COLORS = 'BW' # SGF knows two players, black (1) and white (2)
+SGF_LETTERS = 'abcdefghijklmnopqrstuvwxyz'
+
+## Binary records
+
+def move_width(size):
+    # Bytes per move: one byte holds every point of a 15x15 board and a pass
+    return(1 if size * size < 0xff else 2)
+
+def pack_record(points, size, nplayers=2):
+    ## Encode one game as a binary record
+    # Input
+    #   points : (list(int)) flat points, PASS for a pass
+    #   size : (int) length of a side of the board
+    #   nplayers : (int) players taking turns
+    # Output
+    #   record : (bytes) header and moves
+
+    width = move_width(size)
+    blank = 0xff if width == 1 else 0xffff
+    moves = array('B' if width == 1 else 'H',
+        [blank if p == PASS else p for p in points])
+    if(sys.byteorder == 'big'):
+        moves.byteswap()
+    return(HEADER.pack(len(moves), size, nplayers) + moves.tobytes())
+
+def unpack_moves(data, size):
+    # Decode the moves of a record, see pack_record
+    width = move_width(size)
+    blank = 0xff if width == 1 else 0xffff
+    moves = array('B' if width == 1 else 'H')
+    moves.frombytes(data)
+    if(sys.byteorder == 'big'):
+        moves.byteswap()
+    return([PASS if p == blank else p for p in moves])
+
+def write_record(f, points, size, nplayers=2):
+    # Append one game to the open binary file <f>
+    f.write(pack_record(points, size, nplayers))
+
+def read_records(f):
+    ## Read the games in the open binary file <f> one at a time
+    # Output
+    #   generator of (size, nplayers, points) in file order
+
+    while(True):
+        header = f.read(HEADER.size)
+        if(not header):
+            return
+        if(len(header) < HEADER.size):
+            raise EOFError("Truncated record header")
+        nmoves, size, nplayers = HEADER.unpack(header)
+        data = f.read(nmoves * move_width(size))
+        if(len(data) < nmoves * move_width(size)):
+            raise EOFError("Truncated record of {} moves".format(nmoves))
+        yield(size, nplayers, unpack_moves(data, size))
+
+def append_game(path, points, size, nplayers=2):
+    # Append one game to the binary file at <path>, creating it if need be
+    with open(path, 'ab') as f:
+        write_record(f, points, size, nplayers)
+
+def iter_games(path):
+    # Stream the games of the binary file at <path>, see read_records
+    with open(path, 'rb') as f:
+        for game in read_records(f):
+            yield(game)
+
+## SGF
+
+def sgf_point(p, size):
+    # SGF names a point by its column then its row, 'a' being the first
+    y, x = divmod(p, size)
+    return(SGF_LETTERS[x] + SGF_LETTERS[y])
+
+def to_sgf(points, size, komi=None, result=None):
+    ## Encode one two-player game as SGF
+    # Input
+    #   points : (list(int)) flat points, PASS for a pass
+    #   size : (int) length of a side of the board
+    #   komi : (float) points given to white, recorded as KM
+    #   result : (str) e.g. 'B+3.5', recorded as RE
+    # Output
+    #   sgf : (str) one game tree
+
+    props = ["GM[1]", "FF[4]", "SZ[{}]".format(size)]
+    if(komi is not None):
+        props.append("KM[{}]".format(komi))
+    if(result is not None):
+        props.append("RE[{}]".format(result))
+    nodes = [";" + "".join(props)]
+    for i, p in enumerate(points):
+        nodes.append(";{}[{}]".format(SGF_COLORS[i % 2],
+            "" if p == PASS else sgf_point(p, size)))
+    return("(" + "\n".join(nodes) + ")\n")
+
+def from_sgf(text):
+    ## Decode one SGF game without variations
+    # Moves must alternate starting with black, as to_sgf writes them
+    # Input
+    #   text : (str) SGF
+    # Output
+    #   size : (int) length of a side of the board
+    #   points : (list(int)) flat points, PASS for a pass
+
+    size = re.search(r"SZ\[(\d+)\]", text)
+    size = 19 if size is None else int(size.group(1))
+    points = []
+    for i, m in enumerate(re.finditer(r";\s*([BW])\[([a-z]*)\]", text)):
+        color, loc = m.groups()
+        if(color != SGF_COLORS[i % 2]):
+            raise ValueError("Move {} is out of turn".format(i + 1))
+        if(loc == "" or (loc == "tt" and size <= 19)):
+            points.append(PASS)
+        else:
+            x, y = SGF_LETTERS.index(loc[0]), SGF_LETTERS.index(loc[1])
+            points.append(y * size + x)
+    return(size, points)
@@ -0,0 +1,38 @@
+### Rules engines for the game of Go
+# Author: Eric Kalosa-Kenyon
+# License: MIT
+#
+# The rules engines by name, for the terminal game, self-play and anything
+# else choosing one, the move values shared by the modules that play games,
+# and the moves worth trying in a random game. Importing this module has no
+# side effects.
+###
+
+## Imports
+
+# Local libraries
+from groups import Groups
+from bitboard import Bitboard
+
+## Parameters
+
+ENGINES = {'groups': Groups, 'bitboard': Bitboard}
+BACKEND = 'groups' # Default engine: 'groups' (union-find) or 'bitboard'
+PASS = -1 # Move value for a pass, as a flat point
+NO_KO = -1 # Ko point when no point is forbidden by ko
+KOMI = 7.5 # Points given to player 2 (white) for moving second
+
+## Subroutines
+
+def candidate_moves(engine, player, points=None):
+    # Yield the legal points for <player> that do not fill its own eye, from
+    # <points> in their order, or from all the empty points of <engine>
+    flat = engine.flat
+    adj = engine.adj
+    if(points is None):
+        points = [p for p in range(engine.npoints) if flat[p] == 0]
+    for p in points:
+        if(all([flat[n] == player for n in adj[p]])):
+            continue # own eye
+        if(engine.is_legal(player, p)):
+            yield(p)
@@ -0,0 +1,133 @@
+### Scoring finished games of Go
+# Author: Eric Kalosa-Kenyon
+# License: MIT
+#
+# Territory is found by labelling the connected regions of empty points with
+# vectorized.label and recording which players' stones border each region,
+# using bincounts instead of a flood fill per region. Boards are shaped
+# (..., size, size) like in vectorized.py, so a whole batch of finished
+# games is scored in one call.
+###
+
+## Imports
+
+# 3rd party libraries
+import numpy as np
+
+# Local libraries
+from vectorized import label, liberty_counts, neighbor_values, OFF_BOARD
+
+## Parameters
+
+AREA = 'area' # stones on the board plus surrounded empty points
+TERRITORY = 'territory' # surrounded empty points plus prisoners
+RULES = (AREA, TERRITORY)
+CHUNK = 4096 # Boards scored per batch of array operations, bounding memory
+
+## Subroutines
+
+def territory(board, nplayers=2, labels=None):
+    ## Find the empty points surrounded by a single player
+    # Input
+    #   board : (np.array) shaped (..., size, size)
+    #   nplayers : (int) number of players
+    #   labels : (np.array) output of vectorized.label(board), if computed
+    # Output
+    #   owner : (np.array(int8)) same shape, the player whose stones alone
+    #       border the empty region through each point, 0 for stones and for
+    #       regions bordered by several players or none
+
+    board = np.asarray(board)
+    if(labels is None):
+        labels = label(board)
+    labels = labels.reshape(-1)
+    empty = (board == 0).reshape(-1)
+    values = neighbor_values(board, OFF_BOARD).reshape(4, -1)
+    n = board.size
+
+    owner = np.zeros(n, dtype=np.int8)
+    borders = np.zeros(n, dtype=np.int8) # players next to each region
+    for player in range(1, nplayers + 1):
+        near = (values == player).any(axis=0) & empty
+        touches = np.bincount(labels[near], minlength=n) > 0
+        owner[touches] = player
+        borders += touches
+    owner[borders != 1] = 0
+    return(np.where(empty, owner[labels], 0).reshape(board.shape))
+
+def dead_stones(board, labels=None):
+    ## Estimate which stones are dead at the end of a game
+    # A chain is taken to be dead when it is in atari, so its owner's
+    # opponent could take it at once, unless it touches an enemy chain that
+    # is in atari too, in which case the capturing race is left open. Dead
+    # chains with two or more liberties are not found.
+    # Input
+    #   board : (np.array) shaped (..., size, size)
+    #   labels : (np.array) output of vectorized.label(board), if computed
+    # Output
+    #   dead : (np.array(bool)) same shape, marking the dead stones
+
+    board = np.asarray(board)
+    if(labels is None):
+        labels = label(board)
+    atari = liberty_counts(board, labels) == 1
+    values = neighbor_values(board, OFF_BOARD)
+    near_atari = neighbor_values(atari, False)
+    enemy = (values > 0) & (values != board)
+    race = (enemy & near_atari).any(axis=0) & atari
+    racing = np.bincount(labels[race], minlength=board.size) > 0
+    return(atari & ~racing[labels])
+
+def score(board, nplayers=2, rule=AREA, komi=0.0, prisoners=None,
+        dead=False):
+    ## Count every player's points
+    # Input
+    #   board : (np.array) shaped (..., size, size), final positions
+    #   nplayers : (int) number of players
+    #   rule : (str) AREA or TERRITORY
+    #   komi : (float) points added to player 2
+    #   prisoners : (np.array) shaped (..., nplayers), stones captured by
+    #       each player during the game; used by TERRITORY scoring
+    #   dead : (bool) remove the stones estimated by dead_stones() first,
+    #       counting them as prisoners of the territory they lie in
+    # Output
+    #   points : (np.array(float)) shaped (..., nplayers), points of players
+    #       1, 2, .., nplayers
+
+    assert(rule in RULES)
+    board = np.asarray(board)
+    nboards = int(np.prod(board.shape[:-2]))
+    if(nboards > CHUNK):
+        flat = board.reshape((nboards,) + board.shape[-2:])
+        if(prisoners is not None):
+            prisoners = np.broadcast_to(prisoners,
+                board.shape[:-2] + (nplayers,)).reshape(nboards, nplayers)
+        points = [score(flat[i:i + CHUNK], nplayers, rule, komi,
+            None if prisoners is None else prisoners[i:i + CHUNK], dead)
+            for i in range(0, nboards, CHUNK)]
+        return(np.concatenate(points).reshape(board.shape[:-2] +
+            (nplayers,)))
+
+    labels = label(board)
+    removed = np.zeros(board.shape, dtype=board.dtype)
+    if(dead):
+        mask = dead_stones(board, labels)
+        if(mask.any()):
+            removed = np.where(mask, board, 0)
+            board = np.where(mask, 0, board)
+            labels = label(board)
+    owner = territory(board, nplayers, labels)
+
+    points = np.zeros(board.shape[:-2] + (nplayers,))
+    for player in range(1, nplayers + 1):
+        points[..., player - 1] = (owner == player).sum(axis=(-2, -1))
+        if(rule == AREA):
+            points[..., player - 1] += (board == player).sum(axis=(-2, -1))
+        else:
+            taken = (owner == player) & (removed != 0) & (removed != player)
+            points[..., player - 1] += taken.sum(axis=(-2, -1))
+    if(rule == TERRITORY and prisoners is not None):
+        points += prisoners
+    if(nplayers > 1):
+        points[..., 1] += komi
+    return(points)
@@ -0,0 +1,181 @@
+### Multiprocess self-play farm for the game of Go
+# Author: Eric Kalosa-Kenyon
+# License: MIT
+#
+# Independent random games are played in a pool of worker processes using the
+# rules engines from rules.py. Workers write finished games into a ring of
+# slots in one multiprocessing.shared_memory block, so only a slot number
+# travels back to the parent instead of pickled move lists and boards.
+###
+
+## Imports
+
+# Standard libraries
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from multiprocessing import shared_memory
+
+# 3rd party libraries
+import numpy as np
+
+# Local libraries
+from rules import ENGINES, BACKEND, PASS, candidate_moves
+
+## Parameters
+
+GAMES_PER_TASK = 16 # Games a worker plays before reporting back
+CHUNKS_PER_WORKER = 2 # Ring slots in flight, in tasks, per worker
+SEED = 0
+
+## Shared memory layout
+
+def slot_dtype(size, max_moves):
+    # One finished game: its number, how many moves it took, the moves as
+    # flat points (PASS for a pass) and the final board
+    return(np.dtype([('game', np.int64), ('nmoves', np.int32),
+        ('moves', np.int16, (max_moves,)), ('board', np.int8, (size, size))]))
+
+def ring_view(buf, size, max_moves):
+    # View a shared memory buffer as an array of game slots
+    dt = slot_dtype(size, max_moves)
+    return(np.ndarray((len(buf) // dt.itemsize,), dtype=dt, buffer=buf))
+
+## Worker side
+
+_shm = None # the ring, attached once per worker process
+
+def _attach(name):
+    global _shm
+    _shm = shared_memory.SharedMemory(name=name)
+
+def random_game(size, rng, max_moves, backend=BACKEND):
+    ## Play one game of uniformly random legal moves to the end
+    # Moves never fill the mover's own eye; the game ends after two passes
+    # Input
+    #   size : (int) length of a side of the board
+    #   rng : (np.random.Generator) source of the moves
+    #   max_moves : (int) the game is stopped after this many moves
+    # Output
+    #   moves : (list(int)) flat points, PASS for a pass
+    #   board : (np.array) final position
+
+    board = np.zeros((size, size), dtype=np.int8)
+    engine = ENGINES[backend](board)
+    moves = []
+    player, passes = 1, 0
+    while(passes < 2 and len(moves) < max_moves):
+        points = rng.permutation(np.flatnonzero(engine.flat == 0)).tolist()
+        move = next(candidate_moves(engine, player, points), PASS)
+        if(move == PASS):
+            passes += 1
+        else:
+            passes = 0
+            engine.place(player, move)
+        moves.append(move)
+        player = 3 - player
+    return(moves, board)
+
+def _play_task(first_game, ngames, first_slot, size, max_moves, seed, backend):
+    # Play games first_game, .., first_game + ngames - 1 into the ring
+    ring = ring_view(_shm.buf, size, max_moves)
+    for k in range(ngames):
+        game = first_game + k
+        rng = np.random.default_rng([seed, game])
+        moves, board = random_game(size, rng, max_moves, backend)
+        slot = ring[first_slot + k]
+        slot['game'] = game
+        slot['nmoves'] = len(moves)
+        slot['moves'][:len(moves)] = moves
+        slot['board'] = board
+    del ring
+    return(first_slot, ngames)
+
+## Parent side
+
+def self_play(ngames, size=9, games_per_task=GAMES_PER_TASK, workers=None,
+        seed=SEED, max_moves=None, backend=BACKEND):
+    ## Play <ngames> random games across a process pool
+    # Input
+    #   ngames : (int) total number of games
+    #   size : (int) length of a side of the board
+    #   games_per_task : (int) games each task plays before reporting back
+    #   workers : (int) worker processes, defaults to the number of cores
+    #   seed : (int) game k is played from seed [seed, k], so results do not
+    #       depend on scheduling
+    #   max_moves : (int) moves after which a game is stopped, 3 * size^2
+    #   backend : (str) rules engine, see rules.ENGINES
+    # Output
+    #   generator of (game, moves, board) in completion order, where moves
+    #       is an np.array of flat points (PASS for a pass) and board the
+    #       final position; both are copies out of the ring
+
+    workers = workers or os.cpu_count()
+    max_moves = max_moves or 3 * size * size
+    nchunks = max(1, workers * CHUNKS_PER_WORKER)
+    dt = slot_dtype(size, max_moves)
+    shm = shared_memory.SharedMemory(create=True,
+        size=nchunks * games_per_task * dt.itemsize)
+    ring = slot = None
+    try:
+        ring = ring_view(shm.buf, size, max_moves)
+        free = deque(range(nchunks))
+        starts = deque(range(0, ngames, games_per_task))
+        with ProcessPoolExecutor(workers, initializer=_attach,
+                initargs=(shm.name,)) as pool:
+            running = set()
+            while(starts or running):
+                while(starts and free):
+                    first = starts.popleft()
+                    n = min(games_per_task, ngames - first)
+                    running.add(pool.submit(_play_task, first, n,
+                        free.popleft() * games_per_task, size, max_moves,
+                        seed, backend))
+                done, running = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    first_slot, n = future.result()
+                    for slot in ring[first_slot:first_slot + n]:
+                        yield(int(slot['game']),
+                            slot['moves'][:slot['nmoves']].copy(),
+                            slot['board'].copy())
+                    free.append(first_slot // games_per_task)
+    finally:
+        ring = slot = None # views into the block must go before it closes
+        shm.close()
+        shm.unlink()
+
+## Main
+
+if __name__ == "__main__":
+
+    import argparse
+    import time
+
+    parser = argparse.ArgumentParser(description="Play random games of Go")
+    parser.add_argument('ngames', type=int)
+    parser.add_argument('--size', type=int, default=9)
+    parser.add_argument('--games-per-task', type=int, default=GAMES_PER_TASK)
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--seed', type=int, default=SEED)
+    parser.add_argument('--backend', default=BACKEND, choices=list(ENGINES))
+    parser.add_argument('--out', default=None,
+        help="append the games to this archive, see archive.py")
+    args = parser.parse_args()
+
+    start = time.time()
+    nmoves = 0
+    games = self_play(args.ngames, args.size, args.games_per_task,
+        args.workers, args.seed, backend=args.backend)
+    if(args.out is not None):
+        from archive import append_games
+        def counted(games):
+            global nmoves
+            for game, moves, board in games:
+                nmoves += len(moves)
+                yield(moves.tolist(), args.size, 2)
+        append_games(args.out, counted(games))
+    for game, moves, board in games:
+        nmoves += len(moves)
+    elapsed = time.time() - start
+    print("{} games, {} moves in {:.2f}s: {:.1f} games/s".format(
+        args.ngames, nmoves, elapsed, args.ngames / elapsed))
@@ -0,0 +1,121 @@
+### Board symmetries for the game of Go
+# Author: Eric Kalosa-Kenyon
+# License: MIT
+#
+# A square board has 8 symmetries, the rotations and reflections of the
+# square. Positions that are symmetries of each other are the same position
+# for analysis, so each is named by a canonical key: the smallest Zobrist key
+# among its 8 variants. SymmetricHash keeps all 8 keys up to date as stones
+# come and go, so the canonical key of a game in progress is a min over 8
+# ints rather than 8 transforms of the board.
+###
+
+## Imports
+
+# 3rd party libraries
+import numpy as np
+
+# Local libraries
+from zobrist import zobrist_table, zobrist_array
+
+## Parameters
+
+NSYMMETRIES = 8
+
+## Subroutines
+
+def transform(board, k):
+    # Apply symmetry <k>: k % 4 quarter turns, then a transpose for k >= 4
+    board = np.rot90(board, k % 4, axes=(-2, -1))
+    if(k >= 4):
+        board = np.swapaxes(board, -2, -1)
+    return(board)
+
+_point_maps = {}
+
+def point_maps(size):
+    # Return the (8, size^2) table whose row k sends each flat point to where
+    # symmetry k takes it, i.e. transform(b, k).flat[maps[k, p]] == b.flat[p]
+    if(size not in _point_maps):
+        points = np.arange(size * size).reshape(size, size)
+        maps = np.empty((NSYMMETRIES, size * size), dtype=np.intp)
+        for k in range(NSYMMETRIES):
+            maps[k, transform(points, k).reshape(-1)] = np.arange(size * size)
+        _point_maps[size] = maps
+    return(_point_maps[size])
+
+def inverse(k):
+    # Return the symmetry undoing symmetry <k>
+    return((4 - k) % 4 if k < 4 else k)
+
+def symmetric_keys(board):
+    # Return the Zobrist keys of the 8 variants of <board>, as np.uint64
+    flat = np.asarray(board).reshape(-1)
+    size = np.shape(board)[-1]
+    table = zobrist_array(size * size)
+    maps = point_maps(size)
+    return(np.bitwise_xor.reduce(table[flat[None, :], maps], axis=1))
+
+def canonical(board):
+    ## Find the canonical key of <board>
+    # Output
+    #   key : (int) the smallest of the 8 symmetric Zobrist keys
+    #   ks : (list(int)) every symmetry taking <board> to that key, more
+    #       than one when the position is itself symmetric
+
+    keys = symmetric_keys(board)
+    key = keys.min()
+    return(int(key), np.flatnonzero(keys == key).tolist())
+
+def canonical_board(board):
+    # Return the variant of <board> with the canonical key
+    key, ks = canonical(board)
+    return(transform(board, ks[0]))
+
+_symmetric_tables = {}
+
+def symmetric_table(size):
+    # Return table[player][p], the 8 keys a stone of <player> at <p> adds to
+    # the 8 variants of a position, one per symmetry
+    if(size not in _symmetric_tables):
+        table = zobrist_table(size * size)
+        maps = point_maps(size).T.tolist()
+        _symmetric_tables[size] = [[tuple([row[q] for q in maps[p]])
+            for p in range(size * size)] for row in table]
+    return(_symmetric_tables[size])
+
+## Classes
+
+class SymmetricHash(object):
+
+    def __init__(self, board):
+        ## Start tracking the 8 symmetric keys of the position on <board>
+        # Input
+        #   board : (np.array) square board of player numbers, 0 for empty
+
+        self.table = symmetric_table(np.shape(board)[-1])
+        self.keys = [int(k) for k in symmetric_keys(board)]
+
+    def __repr__(self):
+        msg = "<SymmetricHash: key={}>".format(self.key())
+        return(msg)
+
+    def copy(self):
+        other = object.__new__(SymmetricHash)
+        other.table = self.table
+        other.keys = list(self.keys)
+        return(other)
+
+    def toggle(self, player, p):
+        # Add or remove a stone of <player> at <p>
+        self.keys = [a ^ b for a, b in zip(self.keys, self.table[player][p])]
+
+    def key(self):
+        # Return the canonical key, as canonical(board)[0]
+        return(min(self.keys))
+
+    def canonical(self):
+        # Return the canonical key and the symmetries reaching it, as
+        # canonical(board)
+        key = min(self.keys)
+        return(key, [k for k in range(NSYMMETRIES) if self.keys[k] == key])
@@ -0,0 +1,207 @@
+### Ladder and atari reading for the game of Go
+# Author: Eric Kalosa-Kenyon
+# License: MIT
+#
+# A small tactical search answering two questions about one chain: can it
+# get out of atari with its owner to move, and can the other player capture
+# it in a ladder with the attacker to move. The defender only ever extends
+# from its last liberty or captures a neighboring chain in atari; the
+# attacker only ever plays on one of the defender's two liberties. A chain
+# that reaches three liberties counts as escaped.
+#
+# The search plays and takes back moves on a groups.Groups engine, so a node
+# costs only what place and undo touch, and captures, suicide and ko follow
+# the same rules as the game. Finished answers are remembered by Zobrist key,
+# ko point and chain, and every query stops after a budget of nodes. Only
+# two-player positions are read, as in mcts.py.
+###
+
+## Imports
+
+# 3rd party libraries
+import numpy as np
+
+# Local libraries
+from groups import Groups
+from rules import NO_KO
+
+## Parameters
+
+BUDGET = 500 # Nodes searched per query before giving up
+MAX_MEMO = 1 << 16 # Answers remembered before the memo is cleared
+ESCAPE, CAPTURE = 0, 1 # The two questions, as part of the memo keys
+
+## Classes
+
+class OutOfBudget(Exception):
+    pass
+
+class Reader(object):
+
+    def __init__(self, size, budget=BUDGET):
+        ## Set up tactical reading on <size> by <size> boards
+        # Input
+        #   size : (int) length of a side of the board
+        #   budget : (int) nodes searched per query
+
+        self.size = size
+        self.engine = Groups(np.zeros((size, size), dtype=np.int8))
+        self.ko = NO_KO
+        self.stack = [] # the ko point before each move made
+        self.budget = budget
+        self.nodes = 0 # searched by the last query
+        self.memo = {} # (hash, ko, question, chain) -> answer
+
+    def __repr__(self):
+        msg = "<Reader: size={}, budget={}, memo={}>".format(
+            self.size, self.budget, len(self.memo))
+        return(msg)
+
+    def reset(self, board, ko=NO_KO):
+        ## Set up the position on <board>, which is copied; remembered answers
+        # are kept, since they are keyed by position
+        # Input
+        #   board : (np.array) square board of player numbers, 0 for empty
+        #   ko : (int) flat point the player to move may not play, or NO_KO
+
+        self.engine = Groups(np.array(board, dtype=np.int8))
+        self.ko = ko
+        del self.stack[:]
+
+    ## Chains
+
+    def chain(self, p):
+        # Return the stones and the set of liberties of the chain at <p>; both
+        # belong to the engine and change as moves are made
+        return(self.engine.chain(p), self.engine.liberties(p))
+
+    def _key(self, question, stones):
+        # Name a query: the chain is its smallest stone
+        return((self.engine.hash, self.ko, question, min(stones)))
+
+    ## Moves
+
+    def make(self, player, p):
+        ## Play a stone for <player> at <p> if it is legal under simple ko
+        # Output
+        #   legal : (bool) whether the move was made; illegal moves leave the
+        #       board as it was
+
+        engine = self.engine
+        if(engine.flat[p] != 0 or p == self.ko or
+                engine.is_suicide(player, p)):
+            return(False)
+        self.stack.append(self.ko)
+        ko = engine.ko_point(p, engine.place(player, p))
+        self.ko = NO_KO if ko is None else ko
+        return(True)
+
+    def unmake(self):
+        # Take back the last move made
+        self.engine.undo()
+        self.ko = self.stack.pop()
+
+    ## Search
+
+    def _count(self):
+        self.nodes += 1
+        if(self.nodes > self.budget):
+            raise OutOfBudget()
+
+    def _escapes(self, p):
+        # Whether the chain at <p>, in atari with its owner to move, escapes
+        stones, libs = self.chain(p)
+        key = self._key(ESCAPE, stones)
+        if(key in self.memo):
+            return(self.memo[key])
+        self._count()
+        color, adj = self.engine.flat, self.engine.adj
+        player = self.engine.color(p)
+
+        # Capture a neighboring chain in atari, or extend
+        moves = []
+        seen = set()
+        for s in stones:
+            for q in adj[s]:
+                if(color[q] != 0 and color[q] != player and q not in seen):
+                    enemy, enemy_libs = self.chain(q)
+                    seen.update(enemy)
+                    if(len(enemy_libs) == 1):
+                        moves.extend(enemy_libs)
+        moves.extend(libs)
+
+        result = False
+        for m in moves:
+            if(not self.make(player, m)):
+                continue
+            nlibs = len(self.chain(p)[1])
+            escaped = nlibs >= 3 or (nlibs == 2 and not self._captures(p))
+            self.unmake()
+            if(escaped):
+                result = True
+                break
+        self._remember(key, result)
+        return(result)
+
+    def _captures(self, p):
+        # Whether the other player, to move, captures the two-liberty chain
+        # at <p> by ataris it cannot escape
+        stones, libs = self.chain(p)
+        key = self._key(CAPTURE, stones)
+        if(key in self.memo):
+            return(self.memo[key])
+        self._count()
+        attacker = 3 - self.engine.color(p)
+
+        result = False
+        for m in sorted(libs): # the set changes as moves are made
+            if(not self.make(attacker, m)):
+                continue
+            atari = len(self.chain(p)[1]) == 1
+            caught = atari and not self._escapes(p)
+            self.unmake()
+            if(caught):
+                result = True
+                break
+        self._remember(key, result)
+        return(result)
+
+    def _remember(self, key, result):
+        if(len(self.memo) >= MAX_MEMO):
+            self.memo.clear()
+        self.memo[key] = result
+
+    def _query(self, search, p):
+        # Run <search> from a fresh budget; None when the budget runs out
+        self.nodes = 0
+        depth = len(self.stack)
+        try:
+            return(search(p))
+        except OutOfBudget:
+            while(len(self.stack) > depth):
+                self.unmake()
+            return(None)
+
+    def can_escape(self, p):
+        ## Whether the chain at <p> survives with its owner to move
+        # Output
+        #   escapes : (bool) True when the chain is not in atari or reads out
+        #       of it, False when it is caught, None when the budget ran out
+
+        if(len(self.chain(p)[1]) >= 2):
+            return(True)
+        return(self._query(self._escapes, p))
+
+    def ladder_captures(self, p):
+        ## Whether the other player, to move, captures the chain at <p>
+        # Output
+        #   captures : (bool) True when the chain has one liberty or is caught
+        #       in a ladder, False when it has three or more liberties or
+        #       escapes, None when the budget ran out
+
+        nlibs = len(self.chain(p)[1])
+        if(nlibs <= 1):
+            return(True)
+        if(nlibs >= 3):
+            return(False)
+        return(self._query(self._captures, p))
@@ -7,6 +7,9 @@ from play_in_terminal import endgame, valid_move, neighbors, liberties,\
 # Import constants used
 from play_in_terminal import PASS
 
+# Import the module itself to switch rules engines
+import play_in_terminal
+
 # Import requisite 3rd party libraries
 from numpy import array
 
@@ -51,8 +54,18 @@ class TestValidMove:
         assert(not valid_move(move2, board))
 
     def test_no_state_reversal(self):
-        # TODO
-        assert(False)
+        from play_in_terminal import engine_of
+        board = array([[0,1,2,0],
+                       [1,2,0,2],
+                       [0,1,2,0],
+                       [0,0,0,0]], dtype='int8')
+        engine = engine_of(board)
+        move1 = (1, [2,3]) # player 1 takes the ko
+        move2 = (2, [2,2]) # player 2 immediately takes it back
+        assert(valid_move(move1, engine))
+        engine.place(1, 6)
+        assert(board[1, 1] == 0)
+        assert(not valid_move(move2, engine))
 
 class TestLiberties:
 
@@ -86,8 +99,8 @@ class TestLiberties:
                        [0,0,1,0,0],
                        [0,0,1,0,0],
                        [0,0,1,0,0]])
-        move1 = (1, [3,1])
-        move2 = (1, [4,5])
+        move1 = (1, [1,3])
+        move2 = (1, [5,4])
         assert(liberties(move1, board) == 9)
         assert(liberties(move2, board) == 9)
 
@@ -98,6 +111,15 @@ class TestLiberties:
         move = (1, [2,2])
         assert(liberties(move, board) == 2)
 
+    def test_stone_liberties(self):
+        from play_in_terminal import stone_liberties, engine_of
+        board = array([[0,1,0],
+                       [1,0,2],
+                       [2,0,2]], dtype='int8')
+        move = (1, [3,2])
+        assert(stone_liberties(move, board) == 1)
+        assert(stone_liberties(move, engine_of(board)) == 1)
+
 
 class TestNeighbors:
 
@@ -109,6 +131,8 @@ class TestNeighbors:
     def tearDown(self):
         pass
 
+    setup_method = setUp
+
     def test_corners(self):
         move1 = (1, [1,1])
         move2 = (1, [1,3])
@@ -160,6 +184,15 @@ class TestNeighbors:
 
         assert(all([t in ns1 for t in tn1]))
 
+    def test_engine(self):
+        from play_in_terminal import engine_of
+        board = array([[0,0,0],
+                       [0,0,0],
+                       [0,0,0]], dtype='int8')
+        move = (1, [1,1])
+        ns = neighbors(move, engine_of(board))
+        assert(sorted(ns) == sorted(neighbors(move, board)) == [[1,2],[2,1]])
+
 class TestChain:
 
     def test_small_chain(self):
@@ -167,7 +200,7 @@ class TestChain:
                        [1,0,1],
                        [0,0,0]])
         move = (1, [2,2])
-        true_chain = [[1,2], [2,1], [2,2], [3,2]]
+        true_chain = [[2,1], [1,2], [2,2], [2,3]]
         calculated_chain = chain(move, board)
         assert(all([ch in calculated_chain for ch in true_chain]))
         assert(len(true_chain) == len(calculated_chain))
@@ -177,7 +210,7 @@ class TestChain:
                        [1,0,1],
                        [2,2,0]])
         move = (1, [2,2])
-        true_chain = [[1,2], [2,1], [2,2], [3,2]]
+        true_chain = [[2,1], [1,2], [2,2], [2,3]]
         calculated_chain = chain(move, board)
         assert(all([ch in calculated_chain for ch in true_chain]))
         assert(len(true_chain) == len(calculated_chain))
@@ -196,7 +229,7 @@ class TestCaptured:
                         [1,2,1],
                         [0,0,0]])
 
-        move = (1, [2,3])
+        move = (1, [3,2])
         assert(captured(move, board) == [(2, [2,2])])
 
     def test_chain_capture(self):
@@ -217,3 +250,914 @@ class TestCaptured:
 
         move = (1, [1,1])
         assert(captured(move, board) == [])
+
+class TestGroups:
+
+    def test_incremental_matches_rebuild(self):
+        # Chains kept up to date move by move agree with a fresh build
+        from groups import Groups
+        from numpy import zeros
+        board = zeros((5, 5), dtype='int8')
+        groups = Groups(board)
+        moves = [(1, 6), (2, 7), (1, 12), (2, 11), (1, 8), (2, 13),
+                 (1, 2), (2, 17), (1, 16), (2, 1), (1, 5)]
+        for player, p in moves:
+            assert(groups.is_legal(player, p))
+            groups.place(player, p)
+        rebuilt = Groups(board.copy())
+        for p in range(25):
+            if(board.flat[p]):
+                assert(sorted(groups.chain(p)) == sorted(rebuilt.chain(p)))
+                assert(groups.liberties(p) == rebuilt.liberties(p))
+
+    def test_capture_frees_liberties(self):
+        from groups import Groups
+        board = array([[0,1,0],
+                       [1,2,0],
+                       [0,1,0]], dtype='int8')
+        groups = Groups(board)
+        assert(groups.place(1, 5) == [4]) # capture the center stone
+        assert(board[1, 1] == 0)
+        assert(4 in groups.liberties(1))
+        assert(len(groups.liberties(5)) == 3)
+
+    def test_undo(self):
+        # Taking back every move of a random game gives back each position,
+        # chains and keys included
+        import random
+        from groups import Groups
+        from bitboard import Bitboard
+        from numpy import zeros
+        for engine in (Groups, Bitboard):
+            rng = random.Random(9)
+            board = zeros((5, 5), dtype='int8')
+            groups = engine(board)
+            patterns = groups.track_patterns()
+            seen = []
+            player = 1
+            for turn in range(80):
+                legal = [p for p in range(25) if groups.is_legal(player, p)]
+                if(not legal):
+                    break
+                seen.append((board.copy(), groups.hash, list(patterns.codes)))
+                groups.place(player, rng.choice(legal))
+                player = 3 - player
+            while(seen):
+                groups.undo()
+                before, key, codes = seen.pop()
+                assert((board == before).all() and groups.hash == key)
+                assert(patterns.codes == codes)
+                rebuilt = engine(board.copy())
+                for p in range(25):
+                    if(board.flat[p]):
+                        assert(groups.liberties(p) == rebuilt.liberties(p))
+            assert(len(groups.history) == 1)
+
+    def test_superko_by_move_number(self):
+        # The superko index holds move numbers, whose positions are rebuilt
+        # from the engine's moves only to settle a key collision
+        import random
+        from groups import Groups
+        from bitboard import Bitboard
+        from zobrist import hash_board
+        from numpy import zeros
+        for engine in (Groups, Bitboard):
+            rng = random.Random(3)
+            groups = engine(zeros((7, 7), dtype='int8'))
+            player = 1
+            for turn in range(70): # past a snapshot of the moves
+                legal = [p for p in range(49) if groups.is_legal(player, p)
+                    and any([groups.flat[n] != player for n in groups.adj[p]])]
+                groups.place(player, rng.choice(legal))
+                player = 3 - player
+            other = groups.copy()
+            for g in (groups, other):
+                for key, ns in g.history.positions.items():
+                    for n in ns:
+                        assert(isinstance(n, int))
+                        assert(hash_board(g.moves.position(n)) == key)
+            # A colliding key of a different position does not forbid a move
+            p = [p for p in range(49) if groups.is_legal(player, p)][0]
+            groups.history.add(groups.hash_if_played(player, p), 0)
+            assert(groups.is_legal(player, p))
+            assert(len(other.history) == len(other.moves) + 1)
+
+class TestHistory:
+
+    def test_rebuild_positions(self):
+        # Every position can be rebuilt from the deltas and snapshots
+        from groups import Groups
+        from history import History, NO_POINT
+        from numpy import zeros, array_equal
+        board = zeros((3, 3), dtype='int8')
+        groups = Groups(board)
+        history = History(board, snapshot_every=2)
+        boards = [board.copy()]
+        for player, p in [(1, 1), (2, 0), (1, 3), (2, NO_POINT), (1, 4)]:
+            captures = [] if p == NO_POINT else groups.place(player, p)
+            history.append(player, p, captures, board=board)
+            boards.append(board.copy())
+        assert(history.move(2) == (1, 3, [0], NO_POINT)) # captured corner
+        for n in range(len(boards)):
+            assert(array_equal(history.position(n), boards[n]))
+
+    def test_positions_are_not_aliased(self):
+        from history import History
+        from numpy import zeros
+        board = zeros((3, 3), dtype='int8')
+        history = History(board, snapshot_every=1)
+        board[0, 0] = 1
+        history.append(1, 0, board=board)
+        board[0, 0] = 0
+        assert(history.position(0)[0, 0] == 0)
+        assert(history.position(1)[0, 0] == 1)
+
+    def test_replay_cache(self):
+        # Cached positions match rebuilt ones, within the memory limit, and
+        # checkpoints past a truncation are dropped
+        from history import History, ReplayCache
+        from numpy import zeros, array_equal
+        board = zeros((3, 3), dtype='int8')
+        history = History(board, snapshot_every=4)
+        for p in range(9):
+            board.flat[p] = p % 2 + 1
+            history.append(p % 2 + 1, p, board=board)
+        cache = ReplayCache(history, max_bytes=3 * board.nbytes)
+        for n in [7, 6, 9, 0, 6, 3, 8]:
+            assert(array_equal(cache.position(n), history.position(n)))
+            assert(cache.nbytes <= 3 * board.nbytes)
+        assert(sorted(cache.boards) == cache.numbers == [3, 6, 8])
+        history.truncate(5)
+        cache.forget_after(5)
+        assert(cache.numbers == [3])
+
+class TestTakeBack:
+
+    def setup_method(self, method):
+        # Player 1 captures player 2's corner stone, then player 2 replies
+        from play_in_terminal import engine_of
+        from numpy import zeros
+        self.board = zeros((3, 3), dtype='int8')
+        self.engine = engine_of(self.board)
+        self.cap_stones = zeros((2, 2))
+        self.moves = []
+        for player, p in [(1, 1), (2, 0), (1, 3), (2, 8)]:
+            captures = self.engine.place(player, p)
+            self.cap_stones[player - 1, 1] += len(captures)
+            self.moves.append((player, [p // 3 + 1, p % 3 + 1]))
+
+    def test_human_opponent(self):
+        from play_in_terminal import take_back
+        taken = take_back(self.moves, self.engine, self.cap_stones)
+        assert(taken == [(2, [3, 3])] and len(self.moves) == 3)
+        assert(self.board[2, 2] == 0 and self.cap_stones[0, 1] == 1)
+
+    def test_computer_opponent(self):
+        # Undoing against the computer gives the turn back to the human,
+        # taking back the human's own last move too
+        from play_in_terminal import take_back
+        taken = take_back(self.moves, self.engine, self.cap_stones, [2])
+        assert(taken == [(2, [3, 3]), (1, [2, 1])])
+        assert(taken[-1][0] == 1 and len(self.moves) == 2)
+        assert(self.board.tolist() == [[2, 1, 0], [0, 0, 0], [0, 0, 0]])
+        assert(self.cap_stones.sum() == 0) # the captured stone is back
+        # With only computer moves left, everything is taken back
+        take_back(self.moves, self.engine, self.cap_stones, [1, 2])
+        assert(self.moves == [] and not self.board.any())
+
+class BitboardBackend:
+
+    # Runs a test class's cases again with the bitboard rules engine
+
+    def setUp(self):
+        play_in_terminal.BACKEND = 'bitboard'
+
+    def tearDown(self):
+        play_in_terminal.BACKEND = 'groups'
+
+    def setup_method(self, method):
+        self.setUp()
+
+    def teardown_method(self, method):
+        self.tearDown()
+
+class TestValidMoveBitboard(BitboardBackend, TestValidMove):
+    pass
+
+class TestLibertiesBitboard(BitboardBackend, TestLiberties):
+    pass
+
+class TestChainBitboard(BitboardBackend, TestChain):
+    pass
+
+class TestCapturedBitboard(BitboardBackend, TestCaptured):
+    pass
+
+class TestBitboard:
+
+    def test_matches_groups(self):
+        # Both engines agree on legality, captures and keys over a game
+        import random
+        from groups import Groups
+        from bitboard import Bitboard
+        from numpy import zeros
+        rng = random.Random(5)
+        a, b = zeros((7, 7), dtype='int8'), zeros((7, 7), dtype='int8')
+        groups, bits = Groups(a), Bitboard(b)
+        player = 1
+        for turn in range(120):
+            legal = [p for p in range(49) if groups.is_legal(player, p)]
+            assert(legal == [p for p in range(49) if bits.is_legal(player, p)])
+            if(not legal):
+                break
+            p = rng.choice(legal)
+            assert(sorted(groups.place(player, p)) ==
+                sorted(bits.place(player, p)))
+            assert((a == b).all() and groups.hash == bits.hash)
+            player = 3 - player
+
+class TestLegalMoves:
+
+    def test_matches_valid_move(self):
+        from vectorized import legal_moves
+        from groups import Groups
+        board = array([[0,1,0],
+                       [1,0,1],
+                       [0,1,2]], dtype='int8')
+        for player in [1, 2]:
+            mask = legal_moves(Groups(board), player)
+            for y in range(3):
+                for x in range(3):
+                    move = (player, [y + 1, x + 1])
+                    assert(mask[y, x] == valid_move(move, board))
+
+    def test_no_state_reversal(self):
+        from vectorized import legal_moves
+        from groups import Groups
+        board = array([[0,1,2,0],
+                       [1,2,0,2],
+                       [0,1,2,0],
+                       [0,0,0,0]], dtype='int8')
+        engine = Groups(board)
+        assert(legal_moves(engine, 1)[1, 2])
+        engine.place(1, 6) # player 1 takes the ko
+        assert(legal_moves(Groups(board.copy()), 2)[1, 1]) # without history
+        assert(not legal_moves(engine, 2)[1, 1])
+        assert(legal_moves(engine, 2).sum() == 7)
+
+    def test_matches_groups(self):
+        # Every mask agrees with Groups.is_legal through a random game
+        from vectorized import legal_moves
+        from groups import Groups
+        from numpy import zeros, flatnonzero
+        from random import Random
+        rng = Random(4)
+        engine = Groups(zeros((5, 5), dtype='int8'))
+        player = 1
+        for i in range(60):
+            legal = [p for p in range(25) if engine.is_legal(player, p)]
+            assert(flatnonzero(legal_moves(engine, player)).tolist() == legal)
+            if(not legal):
+                break
+            engine.place(player, rng.choice(legal))
+            player = 3 - player
+
+class TestBatchGames:
+
+    def test_matches_groups(self):
+        # Replaying each game of a batch one move at a time gives the same
+        # final boards
+        from batch import BatchGames, PASS
+        from groups import Groups
+        from numpy import zeros
+        from numpy.random import default_rng
+        games = BatchGames(20, size=5)
+        games.play(default_rng(3))
+        assert(games.over.all())
+        for k in range(20):
+            board = zeros((5, 5), dtype='int8')
+            groups = Groups(board)
+            player = 1
+            for p in games.game(k):
+                if(p != PASS):
+                    assert(board.flat[p] == 0)
+                    assert(not groups.is_suicide(player, p))
+                    groups.place(player, p)
+                player = 3 - player
+            assert((board == games.boards[k]).all())
+
+    def test_chains_match_labels(self):
+        # The chains and liberties kept from move to move are those found by
+        # labelling every board again
+        from batch import BatchGames
+        from vectorized import label, liberty_counts
+        from numpy.random import default_rng
+        rng = default_rng(5)
+        games = BatchGames(12, size=6, nplayers=3)
+        while(not games.over.all()):
+            games.step(games.random_moves(rng))
+            flat = games.boards.reshape(12, -1)
+            labels = label(games.boards).reshape(12, -1)
+            libs = liberty_counts(games.boards).reshape(12, -1)
+            on = flat != 0
+            assert((games.libs[games.labels[on]] == libs[on]).all())
+            pairs = set(zip(labels[on], games.labels[on]))
+            assert(len(pairs) == len(set(labels[on])) ==
+                len(set(games.labels[on])))
+        assert(games.captures.sum() > 0)
+
+class TestSelfPlay:
+
+    def test_games_come_back_through_the_ring(self):
+        # Every game arrives once and matches playing it alone
+        from selfplay import self_play, random_game
+        from numpy.random import default_rng
+        games = list(self_play(6, size=5, games_per_task=4, workers=2,
+            seed=2))
+        assert(sorted([g for g, moves, board in games]) == list(range(6)))
+        for g, moves, board in games:
+            alone, final = random_game(5, default_rng([2, g]), 75)
+            assert(moves.tolist() == alone)
+            assert((board == final).all())
+
+class TestMCTS:
+
+    def test_captures_in_atari(self):
+        # White's chain has one liberty left, at [1, 3]; taking it wins
+        from mcts import MCTSPlayer
+        from groups import Groups
+        board = array([[0,1,0],
+                       [1,2,2],
+                       [0,1,2]], dtype='int8')
+        computer = MCTSPlayer(playouts=300, seed=0)
+        assert(computer.choose(Groups(board), 1) == 2)
+
+    def test_keeps_subtree(self):
+        from mcts import MCTSPlayer
+        from groups import Groups
+        from numpy import zeros
+        engine = Groups(zeros((4, 4), dtype='int8'))
+        computer = MCTSPlayer(playouts=100, seed=1)
+        move = computer.choose(engine, 1)
+        engine.place(1, move)
+        for key, node in computer.table.items():
+            assert(node.visits > 0)
+        assert((engine.hash, 2, 0) in computer.table)
+
+    def test_no_budget(self):
+        # Without playouts or time left a move is still chosen
+        from mcts import MCTSPlayer, PASS
+        from groups import Groups
+        from numpy import zeros
+        engine = Groups(zeros((3, 3), dtype='int8'))
+        move = MCTSPlayer(playouts=0).choose(engine, 1)
+        assert(move == PASS or engine.is_legal(1, move))
+        move = MCTSPlayer(playouts=None, seconds=0).choose(engine, 1)
+        assert(move == PASS or engine.is_legal(1, move))
+        assert(MCTSPlayer(playouts=0).choose(engine, 1, passes=2) == PASS)
+
+class TestPlayout:
+
+    def test_matches_groups(self):
+        # Every random move is legal for groups.Groups and leaves the same
+        # board behind
+        from playout import Playout, PASS
+        from groups import Groups
+        from numpy import zeros
+        rollout = Playout(5, seed=4)
+        for game in range(20):
+            rollout.reset()
+            board = zeros((5, 5), dtype='int8')
+            groups = Groups(board)
+            player, passes = 1, 0
+            for n in range(rollout.max_moves):
+                if(passes == 2):
+                    break
+                p = rollout.random_move(player)
+                if(p == PASS):
+                    passes += 1
+                    rollout.ko = -1
+                else:
+                    passes = 0
+                    assert(board.flat[p] == 0)
+                    assert(not groups.is_suicide(player, p))
+                    rollout.place(player, p)
+                    groups.place(player, p)
+                    assert(rollout.color == board.reshape(-1).tolist())
+                player = 3 - player
+
+    def test_score(self):
+        from playout import Playout
+        board = array([[0,1,2,0],
+                       [1,1,2,2],
+                       [0,1,2,0],
+                       [1,1,2,2]], dtype='int8')
+        rollout = Playout(4)
+        rollout.reset(board)
+        assert(rollout.score() == 0)
+        assert(rollout.score(komi=0.5) == -0.5)
+        assert(rollout.run(1) == 0) # both players can only fill eyes
+
+class TestScoring:
+
+    def setUp(self):
+        self.board = array([[0,1,2,0],
+                            [1,1,2,2],
+                            [0,1,2,1],
+                            [1,1,2,0]], dtype='int8')
+
+    setup_method = setUp
+
+    def test_area(self):
+        from scoring import score
+        assert(score(self.board).tolist() == [9, 6])
+        assert(score(self.board, dead=True).tolist() == [8, 8])
+
+    def test_territory(self):
+        from scoring import score, TERRITORY
+        assert(score(self.board, rule=TERRITORY, komi=0.5,
+            prisoners=[1, 0]).tolist() == [3, 1.5])
+        assert(score(self.board, rule=TERRITORY, dead=True).tolist() ==
+            [2, 4])
+
+    def test_batch(self):
+        from scoring import score, territory
+        from numpy import stack
+        boards = stack([self.board, self.board.T, 3 - self.board])
+        boards[2][self.board == 0] = 0
+        assert(score(boards).tolist() == [[9, 6], [9, 6], [6, 9]])
+        assert(territory(boards)[0].tolist() == [[1,0,0,2],
+                                                 [0,0,0,0],
+                                                 [1,0,0,0],
+                                                 [0,0,0,0]])
+
+    def test_score_game(self):
+        from play_in_terminal import score_game
+        assert(score_game(self.board, dead=False).tolist() == [9, 13.5])
+        assert(score_game(self.board).tolist() == [9, 13.5]) # no estimate
+
+class TestRecords:
+
+    def test_binary_round_trip(self):
+        from records import write_record, read_records, pack_record, PASS
+        from io import BytesIO
+        games = [(9, 2, [40, 0, PASS, 80, PASS, PASS]),
+                 (19, 2, [360, PASS, 0]),
+                 (5, 3, [])]
+        f = BytesIO()
+        for size, nplayers, points in games:
+            write_record(f, points, size, nplayers)
+        assert(len(pack_record([40, 0, PASS], 9)) == 6 + 3)
+        assert(len(pack_record([40, 0, PASS], 19)) == 6 + 6)
+        f.seek(0)
+        assert(list(read_records(f)) == games)
+
+    def test_sgf_round_trip(self):
+        from records import to_sgf, from_sgf, PASS
+        points = [40, 2, PASS, 9, PASS, PASS]
+        sgf = to_sgf(points, 9, komi=7.5, result='B+1')
+        assert(";W[ca]" in sgf and ";B[aa]" not in sgf)
+        assert(";W[ab]" in sgf and "KM[7.5]" in sgf)
+        assert(from_sgf(sgf) == (9, points))
+
+    def test_save_and_load_game(self):
+        from play_in_terminal import save_game, load_games
+        import os
+        import tempfile
+        moves = [(1, (1, [1, 2])), (2, PASS), (1, (1, [9, 9])), (2, PASS),
+            (1, PASS)]
+        with tempfile.TemporaryDirectory() as d:
+            path = os.path.join(d, 'games.rec')
+            sgf = os.path.join(d, 'game.sgf')
+            save_game(moves, array([10, 3.5]), path, sgf)
+            save_game(moves[:1], None, path, None)
+            assert(list(load_games(path)) == [moves, moves[:1]])
+            with open(sgf) as f:
+                assert("RE[B+6.5]" in f.read())
+
+class TestArchive:
+
+    def test_random_access(self):
+        from archive import Archive, append_games, build_index, index_path
+        from selfplay import random_game
+        from numpy.random import default_rng
+        import os
+        import tempfile
+        games = [random_game(5, default_rng(g), 75) for g in range(5)]
+        with tempfile.TemporaryDirectory() as d:
+            path = os.path.join(d, 'games.arc')
+            append_games(path, [(moves, 5, 2) for moves, board in games[:3]])
+            append_games(path, [(moves, 5, 2) for moves, board in games[3:]])
+            with open(index_path(path), 'rb') as f:
+                index = f.read()
+            build_index(path)
+            with open(index_path(path), 'rb') as f:
+                assert(f.read() == index)
+            with Archive(path) as archive:
+                assert(len(archive) == 5)
+                for n in [4, 0, 2]:
+                    moves, board = games[n]
+                    assert(archive[n] == (5, 2, moves))
+                    assert((archive.position(n) == board).all())
+                assert(archive.position(1, 0).sum() == 0)
+
+class TestSymmetry:
+
+    def test_variants_share_a_key(self):
+        from symmetry import canonical, transform, point_maps, inverse
+        board = array([[0,1,0],
+                       [0,2,1],
+                       [0,0,0]], dtype='int8')
+        key, ks = canonical(board)
+        maps = point_maps(3)
+        for k in range(8):
+            variant = transform(board, k)
+            assert(canonical(variant)[0] == key)
+            assert((variant.reshape(-1)[maps[k]] == board.reshape(-1)).all())
+            assert((transform(variant, inverse(k)) == board).all())
+        assert(len(canonical(array([[1,0],[0,1]]))[1]) == 4)
+
+    def test_incremental_keys(self):
+        # The tracked keys follow a game with captures on both engines
+        from symmetry import canonical, symmetric_keys
+        from groups import Groups
+        from bitboard import Bitboard
+        from selfplay import random_game
+        from batch import PASS
+        from numpy import zeros
+        from numpy.random import default_rng
+        moves, final = random_game(5, default_rng(6), 75)
+        for engine in [Groups, Bitboard]:
+            board = zeros((5, 5), dtype='int8')
+            played = engine(board)
+            symmetric = played.track_symmetries()
+            for i, p in enumerate(moves):
+                if(p != PASS):
+                    played.place(i % 2 + 1, p)
+                    assert(symmetric.keys == symmetric_keys(board).tolist())
+            assert(symmetric.canonical() == canonical(board))
+            assert(played.copy().symmetric.keys == symmetric.keys)
+
+class TestBook:
+
+    def test_continuations(self):
+        # Two mirrored games are one opening; rotated lookups find it
+        from book import build_book, OpeningBook, PASS
+        from symmetry import transform
+        from numpy import zeros
+        import os
+        import tempfile
+        games = [(3, 2, [1, 4, PASS, PASS]),
+                 (3, 2, [3, 4, 5, PASS, PASS]),
+                 (3, 2, [4, PASS, PASS])]
+        book = build_book(games, size=3, komi=0.5)
+        empty = zeros((3, 3), dtype='int8')
+        assert(book.lookup(empty, 1) == [(1, 2, 0.5), (4, 1, 1.0)])
+        board = empty.copy()
+        board[0, 1] = 1
+        for k in range(8):
+            rotated = transform(board, k)
+            moves = book.lookup(rotated, 2)
+            assert(len(moves) == 1 and moves[0][1:] == (2, 0.5))
+            assert(rotated.reshape(-1)[moves[0][0]] == 0)
+        with tempfile.TemporaryDirectory() as d:
+            path = os.path.join(d, 'book.npy')
+            book.save(path)
+            loaded = OpeningBook.load(path, 3)
+            assert(loaded.choose(empty, 1, min_count=1) == 4)
+            assert(loaded.choose(empty, 1, min_count=3) is None)
+            del loaded
+
+class TestPatterns:
+
+    def test_incremental_codes(self):
+        from patterns import pattern_code
+        from groups import Groups
+        from selfplay import random_game
+        from batch import PASS
+        from numpy import zeros
+        from numpy.random import default_rng
+        moves, final = random_game(5, default_rng(8), 75)
+        board = zeros((5, 5), dtype='int8')
+        groups = Groups(board)
+        patterns = groups.track_patterns()
+        for i, p in enumerate(moves):
+            if(p != PASS):
+                groups.place(i % 2 + 1, p)
+        assert(patterns.codes == [pattern_code(board, p) for p in range(25)])
+        assert(groups.copy().patterns.codes == patterns.codes)
+
+    def test_flags(self):
+        from patterns import Patterns, EYE, CAPTURE, ESCAPE, CONNECT, CUT
+        from groups import Groups
+        assert(Patterns(array([[0,1,0],
+                               [1,0,0],
+                               [0,0,0]])).flags(1, 0) & EYE)
+        patterns = Patterns(array([[0,1,0],
+                                   [1,2,0],
+                                   [0,0,0]]))
+        assert(patterns.flags(1, 0) == CONNECT) # a false eye in the corner
+        board = array([[0,2,1,0],
+                       [0,1,0,0],
+                       [0,0,0,0],
+                       [0,0,0,0]], dtype='int8')
+        groups = Groups(board)
+        patterns = Patterns(board)
+        assert(patterns.flags(1, 0, groups) & CAPTURE)
+        assert(patterns.flags(2, 0, groups) & ESCAPE)
+        assert(not patterns.flags(1, 0) & CAPTURE) # atari needs the engine
+        patterns = Patterns(array([[0,0,0],
+                                   [1,0,2],
+                                   [0,2,1]]))
+        assert(patterns.flags(1, 4) == CUT)
+        assert(patterns.flags(2, 4) == CONNECT)
+
+class TestTactics:
+
+    def setup_method(self, method):
+        from numpy import zeros
+        # White's stone at (4, 3) has two liberties, with black to move
+        self.board = zeros((9, 9), dtype='int8')
+        self.board[3, 3] = self.board[4, 2] = self.board[5, 4] = 1
+        self.board[4, 3] = 2
+        self.p = 4 * 9 + 3
+
+    def test_make_unmake(self):
+        from tactics import Reader
+        from zobrist import hash_board
+        board = array([[0,1,0],
+                       [1,2,0],
+                       [0,1,0]], dtype='int8')
+        reader = Reader(3)
+        reader.reset(board)
+        engine = reader.engine
+        assert(reader.make(1, 5)) # captures the white stone
+        assert(engine.flat[4] == 0)
+        assert(engine.hash == hash_board(engine.board))
+        assert(not reader.make(2, 4)) # suicide
+        reader.unmake()
+        assert((engine.board == board).all())
+        assert(engine.hash == hash_board(board))
+        assert(engine.liberties(1) == {0, 2})
+
+    def test_ladder(self):
+        from tactics import Reader
+        reader = Reader(9)
+        reader.reset(self.board)
+        assert(reader.ladder_captures(self.p))
+        assert(reader.stack == [])
+        # A white stone in the path of each ladder breaks both
+        self.board[7, 1] = self.board[1, 6] = 2
+        reader.reset(self.board)
+        assert(reader.ladder_captures(self.p) is False)
+
+    def test_escape(self):
+        from tactics import Reader
+        reader = Reader(9)
+        self.board[4, 4] = 1 # atari
+        reader.reset(self.board)
+        assert(reader.can_escape(self.p) is False)
+        # White can capture the black stone at (3, 3) instead of running
+        self.board[2, 3] = self.board[3, 4] = 2
+        reader.reset(self.board)
+        assert(reader.can_escape(self.p))
+
+    def test_budget(self):
+        from tactics import Reader
+        reader = Reader(9, budget=3)
+        reader.reset(self.board)
+        assert(reader.ladder_captures(self.p) is None)
+        assert((reader.engine.board == self.board).all())
+        assert(reader.stack == [] and len(reader.engine.undo_stack) == 0)
+
+class TestProfiling:
+
+    def test_off_by_default(self):
+        import utils
+        def f(x):
+            return x
+        assert(utils.profiled(f) is f or utils.PROFILING)
+
+    def test_profiled(self):
+        # The decorated function's entry is taken out of the registry again,
+        # so profile_report and write_profile do not see it
+        import utils
+        profiling = utils.PROFILING
+        utils.PROFILING = True
+        try:
+            @utils.profiled
+            def double(x):
+                return 2 * x
+            assert(double(4) == 8 and double.__name__ == 'double')
+        finally:
+            utils.PROFILING = profiling
+        name = double.__module__ + '.' + double.__qualname__
+        profile = utils.profiles.pop(name)
+        assert(profile.count == 1 and profile.min == profile.max)
+
+    def test_histogram(self):
+        import utils
+        profile = utils.Profile('f')
+        profile.add(1000)
+        profile.add(3000)
+        assert(profile.buckets[12] == 1) # 2048 <= 3000 < 4096
+        assert(profile.percentile(1.0) >= 4096)
+        assert(profile.summary()['count'] == 2)
+        assert('f' not in utils.profiles)
+
+class TestBench:
+
+    def test_run(self):
+        import bench
+        results = bench.run_benchmarks(sizes=[5], only='.game', min_time=0,
+            repeat=1)
+        assert(sorted(results) == ['playout.game/5', 'selfplay.game/5'])
+        assert(all([us > 0 for us in results.values()]))
+
+    def test_compare(self):
+        import bench
+        baseline = {'a/9': 1.0, 'b/9': 1.0}
+        rows, regressions = bench.compare(
+            {'a/9': 2.0, 'b/9': 1.1, 'c/9': 5.0}, baseline, tolerance=0.5)
+        assert(regressions == 1)
+        assert(rows[0][3] and not rows[1][3] and rows[2][2] is None)
+
+def app_board(size=5):
+    # Return the app module and an empty app.Board, on the dummy video driver
+    # and with the logger app's main would set up
+    import os
+    import logging
+    os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+    import app
+    app.log = logging.getLogger('go-app')
+    return(app, app.Board(app.SCREEN_SIZE, size, size))
+
+def play(board, *locs):
+    # Place stones at <locs> for the players in turn, as the GUI does
+    for loc in locs:
+        board.selector.location = loc
+        board.place_stone()
+
+# Player 1 takes the stone of player 2 in the corner on the third move
+CAPTURE_GAME = [(0, 1), (0, 0), (1, 0), (4, 4), (3, 3)]
+# Then player 2 builds a ko, which player 1 takes on the last move
+KO_GAME = [(0, 1), (0, 2), (1, 0), (2, 2), (2, 1), (1, 3), (4, 4), (1, 1),
+    (1, 2)]
+
+class TestAppNavigation:
+
+    def positions(self, board, locs):
+        # Play <locs>, returning the board and prisoners after each move
+        seen = [(board.state.board.copy(), list(board.state.prisoners))]
+        for loc in locs:
+            play(board, loc)
+            seen.append((board.state.board.copy(), list(board.state.prisoners)))
+        return(seen)
+
+    def check(self, board, seen, n):
+        assert(board.cursor == n and board.state.turn == n)
+        assert((board.state.board == seen[n][0]).all())
+        assert(board.state.prisoners == seen[n][1])
+
+    def test_undo_redo_jump(self):
+        app, board = app_board()
+        seen = self.positions(board, CAPTURE_GAME)
+        assert(seen[3][1] == [0, 1]) # player 2 lost a stone
+        final = board.state.copy()
+        for n in range(len(CAPTURE_GAME), 0, -1):
+            board.undo() # in place
+            self.check(board, seen, n - 1)
+        for n in range(1, len(CAPTURE_GAME) + 1):
+            board.redo() # rebuilt from the history
+            self.check(board, seen, n)
+        assert(board.state == final)
+        for n in (3, 0, 4, 2):
+            board.jump(n)
+            self.check(board, seen, n)
+        board.undo() # falls back to jump, with no undo records
+        self.check(board, seen, 1)
+
+    def test_play_after_undo_branches(self):
+        app, board = app_board()
+        seen = self.positions(board, CAPTURE_GAME)
+        board.undo()
+        board.undo()
+        play(board, (2, 2))
+        assert(len(board.history) == board.cursor == 4)
+        assert(len(board.positions) == len(board.keys) == 5)
+        board.redo() # nothing left to redo
+        assert(board.cursor == 4 and board.state.board[2, 2] == 2)
+        board.jump(3)
+        self.check(board, seen, 3)
+
+    def test_superko_after_branching(self):
+        app, board = app_board()
+        play(board, *KO_GAME)
+        assert(board.state.prisoners == [0, 1])
+        assert(not board.valid_move((1, 1))) # retaking repeats a position
+        for m in range(2):
+            board.undo()
+        play(board, (3, 0), (3, 1)) # a different line after move 7
+        assert(board.valid_move((1, 1)))
+        play(board, (1, 1), (1, 2))
+        assert(board.state.board[1, 1] == 0 and board.cur_player.number == 2)
+        assert(not board.valid_move((1, 1)))
+        assert(len(board.positions) == len(board.history) + 1 == 12)
+
+class TestAppMoves:
+
+    def snapshot(self, board):
+        state = board.state
+        return((state.board.copy(), state.key, state.turn,
+            list(state.prisoners), state.move, len(state.undo_stack)))
+
+    def same(self, board, snapshot):
+        now = self.snapshot(board)
+        return((now[0] == snapshot[0]).all() and now[1:] == snapshot[1:])
+
+    def test_play_undo_capture(self):
+        app, board = app_board()
+        play(board, *CAPTURE_GAME[:2])
+        before = self.snapshot(board)
+        state = board.play_move((1, 0))
+        assert(state is board.state) # played in place
+        assert(state.board[0, 0] == 0 and state.prisoners == [0, 1])
+        assert(state.move == (1, (1, 0), [(0, 0)]))
+        assert(state.key != before[1])
+        state.undo()
+        assert(self.same(board, before))
+
+    def test_valid_move_leaves_state(self):
+        app, board = app_board()
+        play(board, *KO_GAME)
+        before = self.snapshot(board)
+        assert(board.valid_move((3, 3)))
+        assert(self.same(board, before))
+        # Occupied, a ko retake, and suicide for player 2
+        for loc in [(0, 1), (1, 1), (0, 0)]:
+            assert(not board.valid_move(loc))
+            assert(self.same(board, before))
+
+class TestAppState:
+
+    def test_stone_at(self):
+        app, board = app_board()
+        play(board, *CAPTURE_GAME)
+        state = board.state
+        stone = state.stone_at((0, 1))
+        assert(stone.location == (0, 1) and stone.player.number == 1)
+        assert(state.stone_at((4, 4)).player.number == 2)
+        assert(state.stone_at((0, 0)) is False) # captured
+        assert(sorted([s.location for s in state.board_stones]) ==
+            [(0, 1), (1, 0), (3, 3), (4, 4)])
+        assert(not hasattr(state, '__dict__'))
+
+    def test_get_chain(self):
+        app, board = app_board()
+        play(board, (1, 1), (0, 0), (1, 2), (4, 4), (2, 2))
+        state = board.state
+        assert(sorted(board.get_chain((1, 2), state)) ==
+            [(1, 1), (1, 2), (2, 2)])
+        assert(board.get_chain((0, 0), state) == [(0, 0)])
+        state.board[0, 1] = 2 # joins the corner, not the other player
+        assert(sorted(board.get_chain((0, 0), state)) == [(0, 0), (0, 1)])
+
+    def test_copy(self):
+        app, board = app_board()
+        play(board, *CAPTURE_GAME)
+        state = board.state
+        other = state.copy()
+        assert(other == state and other.key == state.key)
+        assert(other.board is not state.board)
+        assert(other.prisoners is not state.prisoners)
+        other.board[2, 2] = 1
+        other.prisoners[0] += 1
+        assert(state.board[2, 2] == 0 and state.prisoners == [0, 1])
+        assert(other != state)
+
+class TestLogging:
+
+    def test_queued(self):
+        # Queued records reach the file once the listener is stopped, and a
+        # second call switches the same handlers back to direct writing
+        import utils
+        import os
+        import tempfile
+        from logging.handlers import QueueHandler
+        with tempfile.TemporaryDirectory() as d:
+            name = os.path.join(d, 'go-queued')
+            log = utils.make_logger(name, verbose = False, queued = True)
+            assert([type(h) for h in log.handlers] == [QueueHandler])
+            log.info("first")
+            assert(utils.make_logger(name, verbose = False) is log)
+            assert(name not in utils.listeners)
+            log.info("second")
+            with open(name + '.log') as f:
+                lines = f.read().splitlines()
+            assert([l.split(' - ')[-1] for l in lines] == ["first", "second"])
+            utils.make_logger(name, queued = True)
+            assert(len(log.handlers) == 1 and name in utils.listeners)
+            utils.set_queued(log, False)
+            for handler in list(log.handlers):
+                log.removeHandler(handler)
+                handler.close()
@@ -1,8 +1,32 @@
+import atexit
+import functools
+import json
 import logging
+import logging.handlers
+import os
+import queue
+import sys
+import time
 
-def make_logger(name, verbose = True):
+# Set GO_PROFILE=1 to time the functions decorated with profiled; the summary
+# is written at exit to <GO_PROFILE_FILE>.txt and .json
+PROFILE_ENV = 'GO_PROFILE'
+PROFILE_FILE_ENV = 'GO_PROFILE_FILE'
+PROFILE_FILE = 'go-profile'
+PROFILING = os.environ.get(PROFILE_ENV, '') not in ('', '0')
+
+listeners = {} # logger name -> QueueListener writing its queued records
+
+def make_logger(name, verbose = True, queued = False):
     # https://docs.python.org/2/howto/logging-cookbook.html
+    # With <queued>, records are put on a queue and written out by a
+    # background thread, so logging never waits on the disk or the terminal.
+    # Calling it again for the same name keeps the handlers already made,
+    # <verbose> included, but switches to or from the queue as <queued> asks
     logger = logging.getLogger(name)
+    if logger.handlers:
+        set_queued(logger, queued)
+        return logger
     logger.setLevel(logging.DEBUG)
     # create file handler which logs even debug messages
     fh = logging.FileHandler('{}.log'.format(name))
@@ -16,29 +40,131 @@ def make_logger(name, verbose = True):
     fh.setFormatter(formatter)
     ch.setFormatter(formatter)
     # add the handlers to the logger
-    logger.addHandler(fh)
+    handlers = [fh]
     if verbose:
-        logger.addHandler(ch)
+        handlers.append(ch)
+    for handler in handlers:
+        logger.addHandler(handler)
+    set_queued(logger, queued)
     return logger
 
-def _writetolog(what, log, debuglevel):
-
-    if debuglevel == "debug":
-        log.debug("function <{}> returned <{}>".format(
-            function, result))
-    elif debuglevel == "info":
-        log.info("function <{}> returned <{}>".format(
-            function, result))
-    else:
-        raise Exception('Unsupported debugging level <{}>'.format(
-            debugging))
-
-def loggable(log, debuglevel="debug"):
-    # decorator that logs returned object of function
-    def wrap(function):
-        def inner(*args):
-            result = function(args)
-            _writetolog(what, log, debuglevel)
-            return result
-        return inner
-    return wrap
+def set_queued(logger, queued):
+    # Move the handlers of <logger> behind a queue and a listener thread, or,
+    # when not <queued>, write out what is queued and attach them directly
+    listener = listeners.get(logger.name)
+    if queued and listener is None:
+        records = queue.Queue(-1)
+        handlers = list(logger.handlers)
+        for handler in handlers:
+            logger.removeHandler(handler)
+        listener = logging.handlers.QueueListener(records, *handlers,
+                respect_handler_level = True)
+        listener.start()
+        atexit.register(listener.stop) # flush what's left at exit
+        listeners[logger.name] = listener
+        logger.addHandler(logging.handlers.QueueHandler(records))
+    elif not queued and listener is not None:
+        listener.stop()
+        atexit.unregister(listener.stop)
+        del listeners[logger.name]
+        for handler in list(logger.handlers):
+            logger.removeHandler(handler)
+        for handler in listener.handlers:
+            logger.addHandler(handler)
+
+class Profile(object):
+    # Call count and latency histogram of one function; bucket k counts the
+    # calls taking from 2^(k-1) up to 2^k nanoseconds
+    __slots__ = ('name', 'count', 'total', 'min', 'max', 'buckets')
+
+    def __init__(self, name):
+        self.name = name
+        self.count = 0
+        self.total = 0 # ns
+        self.min = None
+        self.max = 0
+        self.buckets = [0] * 64
+
+    def __repr__(self):
+        msg = "<Profile: name={}, count={}>".format(self.name, self.count)
+        return msg
+
+    def add(self, ns):
+        self.count += 1
+        self.total += ns
+        if self.min is None or ns < self.min:
+            self.min = ns
+        if ns > self.max:
+            self.max = ns
+        self.buckets[ns.bit_length()] += 1
+
+    def percentile(self, q):
+        # Upper bound in ns of the bucket holding the <q> quantile of calls
+        if not self.count:
+            return 0
+        seen = 0
+        for k, n in enumerate(self.buckets):
+            seen += n
+            if seen >= q * self.count:
+                return 1 << k
+        return 0
+
+    def summary(self):
+        return {'count': self.count, 'total_ns': self.total,
+                'mean_ns': self.total / self.count if self.count else 0,
+                'min_ns': self.min, 'max_ns': self.max,
+                'p50_ns': self.percentile(0.5),
+                'p90_ns': self.percentile(0.9),
+                'p99_ns': self.percentile(0.99),
+                'histogram': dict((str(1 << k), n)
+                    for k, n in enumerate(self.buckets) if n)}
+
+profiles = {} # qualified function name -> Profile
+
+def profiled(function):
+    # Decorator recording the calls and latencies of <function> when
+    # profiling is on; otherwise <function> is returned as it is, so the
+    # decorator costs nothing. Nested profiled calls count in both
+    if not PROFILING:
+        return function
+    name = '{}.{}'.format(function.__module__, function.__qualname__)
+    profile = profiles.setdefault(name, Profile(name))
+    clock = time.perf_counter_ns
+
+    @functools.wraps(function)
+    def inner(*args, **kwargs):
+        start = clock()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            profile.add(clock() - start)
+    return inner
+
+def profile_report():
+    # Return a table of the profiled functions, most total time first
+    rows = sorted(profiles.values(), key = lambda p: -p.total)
+    header = "{:<48} {:>9} {:>10} {:>9} {:>9} {:>9}"
+    row = "{:<48} {:>9} {:>10.1f} {:>9.2f} {:>9.2f} {:>9.2f}"
+    lines = [header.format(
+        "function", "calls", "total ms", "mean us", "p50 us", "p99 us")]
+    for p in rows:
+        if not p.count:
+            continue
+        lines.append(row.format(
+            p.name[-48:], p.count, p.total / 1e6, p.total / p.count / 1e3,
+            p.percentile(0.5) / 1e3, p.percentile(0.99) / 1e3))
+    return "\n".join(lines) + "\n"
+
+def write_profile(path = None):
+    # Write profile_report to <path>.txt and every histogram to <path>.json
+    if path is None:
+        path = os.environ.get(PROFILE_FILE_ENV, PROFILE_FILE)
+    with open(path + '.txt', 'w') as f:
+        f.write(profile_report())
+    with open(path + '.json', 'w') as f:
+        json.dump(dict((name, p.summary()) for name, p in profiles.items()
+                if p.count), f, indent = 1, sort_keys = True)
+    sys.stderr.write("profile written to {}.txt and .json\n".format(path))
+
+if PROFILING:
+    atexit.register(write_profile)
@@ -0,0 +1,158 @@
+### Whole-board array operations for the game of Go
+# Author: Eric Kalosa-Kenyon
+# License: MIT
+#
+# Chains, liberties and legal moves computed for every point at once with
+# numpy, instead of one point at a time in Python. Boards are arrays of
+# player numbers with 0 for empty, shaped (..., size, size) so that any
+# number of leading dimensions holds a batch of boards. The legal moves of a
+# single game are read off the chains its rules engine already keeps.
+###
+
+## Imports
+
+# 3rd party libraries
+import numpy as np
+
+# Local libraries
+from zobrist import zobrist_array
+
+## Parameters
+
+OFF_BOARD = -1 # Value seen when looking past the edge of the board
+DIRECTIONS = ((-1, 0), (1, 0), (0, -1), (0, 1))
+
+## Subroutines
+
+def neighbor_values(a, fill):
+    ## Return the value of every point's four neighbors
+    # Input
+    #   a : (np.array) shaped (..., size, size)
+    #   fill : value used for neighbors past the edge of the board
+    # Output
+    #   values : (np.array) shaped (4, ..., size, size), one per DIRECTIONS
+
+    m = np.shape(a)[-1]
+    pad = [(0, 0)] * (np.ndim(a) - 2) + [(1, 1), (1, 1)]
+    padded = np.pad(a, pad, constant_values=fill)
+    return(np.stack([padded[..., 1 + dy:1 + dy + m, 1 + dx:1 + dx + m]
+        for dy, dx in DIRECTIONS]))
+
+_neighbor_indices = {}
+
+def neighbor_indices(size):
+    # Return the (4, size^2) flat index of each point's neighbor in every
+    # direction, or of the point itself where the neighbor is off the board
+    if(size not in _neighbor_indices):
+        points = np.arange(size * size).reshape(size, size)
+        _neighbor_indices[size] = neighbor_values(points, -1).reshape(4, -1)
+        off = _neighbor_indices[size] < 0
+        _neighbor_indices[size][off] = np.nonzero(off)[1]
+    return(_neighbor_indices[size])
+
+_edge_indices = {}
+
+def edge_indices(size):
+    # Return the (4, size^2) flat index of each point's neighbor in every
+    # direction, or size^2 where the neighbor is off the board, for indexing
+    # flat arrays with one extra value appended for the edge
+    if(size not in _edge_indices):
+        nbr = neighbor_indices(size).copy()
+        nbr[nbr == np.arange(size * size)] = size * size
+        _edge_indices[size] = nbr
+    return(_edge_indices[size])
+
+def label(board):
+    ## Label the connected regions of equal value, stones and empty alike
+    # Input
+    #   board : (np.array) shaped (..., size, size)
+    # Output
+    #   labels : (np.array) same shape, each point labelled with the smallest
+    #       flat index (over the whole batch) of a point in its region
+
+    board = np.asarray(board)
+    m2 = board.shape[-1] ** 2
+    flat = board.reshape(-1, m2)
+    n = flat.size
+
+    # Neighbor of each point in each direction over the whole batch, pointing
+    # back at the point itself unless the two share a value
+    idx = neighbor_indices(board.shape[-1])[:, None, :] + \
+        (np.arange(len(flat)) * m2)[None, :, None]
+    idx = idx.reshape(4, n).astype(np.int32)
+    points = np.arange(n, dtype=np.int32)
+    idx = np.where(flat.reshape(-1)[idx] == flat.reshape(-1), idx, points)
+
+    labels = points
+    while(True):
+        new = labels[idx].min(axis=0)
+        new = new[new] # pointer jumping, each label is a point of the region
+        new = new[new]
+        if(np.array_equal(new, labels)):
+            return(labels.reshape(board.shape))
+        labels = new
+
+def liberty_counts(board, labels=None):
+    ## Count the liberties of the chain through every point
+    # Input
+    #   board : (np.array) shaped (..., size, size)
+    #   labels : (np.array) output of label(board), if already computed
+    # Output
+    #   libs : (np.array) same shape, liberties of the chain at each stone,
+    #       0 at empty points
+
+    board = np.asarray(board)
+    if(labels is None):
+        labels = label(board)
+    n = board.size
+    empty = board == 0
+    stone_near = neighbor_values(board, 0) != 0
+    label_near = neighbor_values(labels, -1)
+
+    # Every empty point is one liberty of each distinct chain next to it
+    counts = np.zeros(n, dtype=np.int64)
+    for d in range(len(DIRECTIONS)):
+        fresh = stone_near[d] & empty
+        for e in range(d):
+            fresh &= label_near[e] != label_near[d]
+        counts += np.bincount(label_near[d][fresh], minlength=n)
+    return(np.where(board != 0, counts[labels], 0))
+
+def legal_moves(engine, player):
+    ## Mark every point where <player> may play on the position of <engine>
+    # The chains and their liberties are read from the engine instead of
+    # being labelled again, and only moves whose Zobrist key after the move
+    # is already in the engine's history are checked for superko one by one
+    # Input
+    #   engine : (groups.Groups) rules engine at the position
+    #   player : (int) player to move
+    # Output
+    #   mask : (np.array(bool)) shaped (size, size)
+
+    n = engine.npoints
+    libs = np.zeros(n + 1, dtype=np.int64) # 0 past the edge of the board
+    for root, stones in engine.stones.items():
+        libs[stones] = len(engine.libs[root])
+    flat = np.append(engine.flat, OFF_BOARD)
+    nbr = edge_indices(engine.size)
+    values = flat[nbr]
+    near_libs = libs[nbr]
+
+    enemy = (values != 0) & (values != OFF_BOARD) & (values != player)
+    captures = (enemy & (near_libs == 1)).any(axis=0)
+    breathes = (values == 0).any(axis=0) | captures | \
+        ((values == player) & (near_libs > 1)).any(axis=0)
+    mask = (flat[:n] == 0) & breathes
+    if(len(engine.history) == 0):
+        return(mask.reshape(engine.board.shape))
+
+    # Key after each candidate move; captures are rare, so those moves
+    # ask the engine
+    points = np.flatnonzero(mask)
+    after = engine.hash ^ zobrist_array(n)[player, points]
+    for i in np.flatnonzero(captures[points]).tolist():
+        after[i] = engine.hash_if_played(player, int(points[i]))
+    known = np.fromiter(engine.history.positions.keys(), dtype=np.uint64)
+    for p in points[np.isin(after, known)].tolist():
+        mask[p] = not engine.repeats(player, p)
+    return(mask.reshape(engine.board.shape))
@@ -0,0 +1,120 @@
+### Zobrist hashing of Go positions
+# Author: Eric Kalosa-Kenyon
+# License: MIT
+#
+# A position's key is the xor of one random 64-bit number per (player, point)
+# occupied, so playing or removing a stone updates the key with a single xor.
+# PositionIndex remembers the keys of every position in a game, which makes
+# positional superko an O(1) check.
+###
+
+## Imports
+
+# Standard libraries
+import random
+
+# 3rd party libraries
+import numpy as np
+
+## Parameters
+
+SEED = 20170524 # Fixed so keys agree between processes and saved games
+MAX_PLAYERS = 4
+
+## Subroutines
+
+_tables = {}
+
+def zobrist_table(npoints, nplayers=MAX_PLAYERS, seed=SEED):
+    ## Return the random keys for every (player, point) pair
+    # Input
+    #   npoints : (int) number of points on the board
+    #   nplayers : (int) largest player number that will be hashed
+    # Output
+    #   table : (list(list(int))) table[player][point], row 0 is all zeros
+    #       so that empty points hash to nothing
+
+    k = (npoints, nplayers, seed)
+    if(k not in _tables):
+        rng = random.Random(seed + npoints)
+        table = [[0] * npoints]
+        for pl in range(nplayers):
+            table.append([rng.getrandbits(64) for p in range(npoints)])
+        _tables[k] = table
+    return(_tables[k])
+
+def zobrist_array(npoints, nplayers=MAX_PLAYERS, seed=SEED):
+    # The same keys as zobrist_table, as a (nplayers + 1, npoints) np.uint64
+    return(np.array(zobrist_table(npoints, nplayers, seed), dtype=np.uint64))
+
+def hash_board(board, table=None):
+    # Hash a whole board from scratch, for building keys of existing positions
+    flat = np.asarray(board).reshape(-1)
+    if(table is None):
+        table = zobrist_table(len(flat))
+    h = 0
+    for p in np.flatnonzero(flat).tolist():
+        h ^= table[flat[p]][p]
+    return(h)
+
+## Classes
+
+class PositionIndex(object):
+
+    def __init__(self, equal=None):
+        ## Set of previously seen positions, keyed by Zobrist hash
+        # Input
+        #   equal : (function) exact comparison of a stored position with
+        #       a queried one, used only when two keys collide; defaults to ==
+
+        self.positions = {} # key -> list of positions with that key
+        self.equal = equal if equal is not None else (lambda a, b: a == b)
+
+    def __repr__(self):
+        msg = "<PositionIndex: npositions={}>".format(len(self))
+        return(msg)
+
+    def __len__(self):
+        return(sum([len(ps) for ps in self.positions.values()]))
+
+    def copy(self, equal=None):
+        # Return an independent index, comparing with <equal> if given, e.g.
+        # when the stored positions are looked up in a copied game
+        index = PositionIndex(equal if equal is not None else self.equal)
+        index.positions = dict((k, list(ps))
+            for k, ps in self.positions.items())
+        return(index)
+
+    def __contains__(self, key):
+        # Whether any position with this key has been seen, no exact check
+        return(key in self.positions)
+
+    def add(self, key, position):
+        self.positions.setdefault(key, []).append(position)
+
+    def discard(self, key, position):
+        # Forget one occurrence of the stored <position>, e.g. when a move is
+        # taken back
+        ps = self.positions.get(key, [])
+        for i, q in enumerate(ps):
+            if(q == position):
+                del ps[i]
+                break
+        if(not ps):
+            self.positions.pop(key, None)
+
+    def seen(self, key, position):
+        ## Determine whether <position> occurred before
+        # Input
+        #   key : (int) Zobrist hash of <position>
+        #   position : exact representation of the position, or a function
+        #       returning one, so it is only built on a key hit
+        # Output
+        #   seen : (bool) whether an identical position is in the index
+
+        ps = self.positions.get(key)
+        if(not ps):
+            return(False)
+        if(callable(position)):
+            position = position()
+        return(any([self.equal(q, position) for q in ps]))